@@ -13,6 +13,7 @@ import os
 import dj_database_url
 from pathlib import Path
 from datetime import timedelta
+from decimal import Decimal
 from dotenv import load_dotenv
 
 # Load environment variables from .env
@@ -68,6 +69,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware", 
+    "shop.instrumentation.RequestInstrumentationMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -105,10 +107,106 @@ DATABASES = {
     'default': dj_database_url.config(
         default=f"postgres://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST', 'db')}:{os.getenv('POSTGRES_PORT', 5432)}/{os.getenv('POSTGRES_DB')}",
         conn_max_age=600,  # keep connections open
+        conn_health_checks=True,  # and check a reused one before each request
         ssl_require=not DEBUG,  # require SSL in production
     )
 }
 
+# Optional read replicas (comma-separated URLs), as aliases replica_1,
+# replica_2, ... Safe catalog and order-history reads go to them; see
+# shop/routing.py.
+DATABASE_REPLICAS = []
+for i, url in enumerate(filter(None, os.getenv("DATABASE_REPLICA_URLS", "").split(",")), start=1):
+    DATABASES[f"replica_{i}"] = dj_database_url.parse(
+        url.strip(), conn_max_age=600, conn_health_checks=True, ssl_require=not DEBUG
+    )
+    DATABASE_REPLICAS.append(f"replica_{i}")
+DATABASE_ROUTERS = ["shop.routing.ReplicaRouter"] if DATABASE_REPLICAS else []
+
+# Connection pooling (PostgreSQL, psycopg 3). Persistent connections are
+# per thread, so gthread and ASGI workers hold one per thread that ever
+# served a request. With DATABASE_POOL=true each process instead shares
+# MIN_SIZE..MAX_SIZE connections among its threads; a request waits up to
+# DATABASE_POOL_TIMEOUT seconds for one and then fails. Connections are
+# checked before being handed out (DATABASE_POOL_CHECK), closed after
+# MAX_IDLE seconds unused beyond MIN_SIZE, and replaced after
+# MAX_LIFETIME. Keep MAX_SIZE x processes below the server's
+# max_connections. Pool statistics are exported at /api/metrics
+# (shop_db_pool_*); `manage.py bench_pool` compares both setups.
+DATABASE_POOL = os.getenv("DATABASE_POOL", "False").lower() == "true"
+if DATABASE_POOL:
+    for database in DATABASES.values():
+        if database["ENGINE"] == "django.db.backends.postgresql":
+            # The pool replaces persistent connections; Django refuses both.
+            database["CONN_MAX_AGE"] = 0
+            # With a pool, this makes the pool check connections on checkout.
+            database["CONN_HEALTH_CHECKS"] = os.getenv("DATABASE_POOL_CHECK", "true").lower() == "true"
+            database.setdefault("OPTIONS", {})["pool"] = {
+                "min_size": int(os.getenv("DATABASE_POOL_MIN_SIZE", 2)),
+                "max_size": int(os.getenv("DATABASE_POOL_MAX_SIZE", 10)),
+                "timeout": float(os.getenv("DATABASE_POOL_TIMEOUT", 10)),
+                "max_idle": float(os.getenv("DATABASE_POOL_MAX_IDLE", 300)),
+                "max_lifetime": float(os.getenv("DATABASE_POOL_MAX_LIFETIME", 3600)),
+            }
+
+# Cache
+# "catalog" holds cached product/category responses (shop/cache.py).
+# Without CACHE_URL it is a per-process LocMemCache: MAX_ENTRIES bounds it
+# with LRU culling, but invalidation doesn't reach other gunicorn workers,
+# so keep CATALOG_CACHE_TIMEOUT short. With CACHE_URL (redis://...) all
+# workers share entries and the version counter; configure the Redis
+# server with maxmemory + allkeys-lru to bound it.
+CACHE_URL = os.getenv("CACHE_URL")
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", 60 if not CACHE_URL else 600))
+
+if CACHE_URL:
+    CATALOG_CACHE = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CACHE_URL,
+        "TIMEOUT": CATALOG_CACHE_TIMEOUT,
+        "KEY_PREFIX": "catalog",
+    }
+else:
+    CATALOG_CACHE = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "catalog",
+        "TIMEOUT": CATALOG_CACHE_TIMEOUT,
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", 5000)),
+        },
+    }
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "catalog": CATALOG_CACHE,
+}
+
+# HTTP caching of catalog GETs (ETag / Last-Modified revalidation).
+# Browsers revalidate after CATALOG_HTTP_MAX_AGE seconds; a reverse proxy
+# in front of gunicorn may serve its copy for CATALOG_PROXY_MAX_AGE.
+CATALOG_HTTP_MAX_AGE = int(os.getenv("CATALOG_HTTP_MAX_AGE", 0))
+CATALOG_PROXY_MAX_AGE = int(os.getenv("CATALOG_PROXY_MAX_AGE", 10))
+# Default price bucket boundaries of /api/products/facets/.
+PRODUCT_FACET_PRICE_BUCKETS = [
+    Decimal(edge) for edge in os.getenv("PRODUCT_FACET_PRICE_BUCKETS", "10,25,50,100,250").split(",")
+]
+
+# Password hashing
+# PBKDF2 work factor per environment: keep Django's default in production,
+# lower it in CI / load tests where hashing dominates registration time.
+# Unset (or 0) means Django's default.
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", 0))
+
+PASSWORD_HASHERS = [
+    "shop.hashers.ConfigurablePBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -145,18 +243,28 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+# STATICFILES_STORAGE was removed in Django 5.1; STORAGES replaces it.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"},
+}
 
 
 # media settings
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# Served by shop.media.serve_media. Behind nginx, point this at an
+# `internal` location aliased to MEDIA_ROOT (e.g. /protected-media/) and
+# nginx sends the files itself.
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv("MEDIA_ACCEL_REDIRECT_PREFIX", "")
+# Cache lifetime of media without a content-hashed name.
+MEDIA_MAX_AGE = int(os.getenv("MEDIA_MAX_AGE", 3600))
 
 
 # REST FRAMEWORK & JWT
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "shop.authentication.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
@@ -178,7 +286,21 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": True,
     "AUTH_HEADER_TYPES": ("Bearer",),
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
+    "TOKEN_REFRESH_SERIALIZER": "shop.tokens.FilteredTokenRefreshSerializer",
 }
+
+# Refresh-token blacklist (see shop/tokens.py). Each process checks JTIs
+# against a Bloom filter sized for TOKEN_BLACKLIST_FILTER_CAPACITY entries
+# and pulls other processes' logouts every TOKEN_BLACKLIST_SYNC_INTERVAL
+# seconds. `manage.py prune_tokens` deletes expired outstanding tokens.
+TOKEN_BLACKLIST_FILTER_CAPACITY = int(os.getenv("TOKEN_BLACKLIST_FILTER_CAPACITY", 100000))
+TOKEN_BLACKLIST_SYNC_INTERVAL = float(os.getenv("TOKEN_BLACKLIST_SYNC_INTERVAL", 2))
+TOKEN_PRUNE_CHUNK_SIZE = int(os.getenv("TOKEN_PRUNE_CHUNK_SIZE", 1000))
+
+# Per-process cache of JWT users (see shop/authentication.py). Local saves
+# invalidate immediately; other workers see changes within the timeout.
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv("AUTH_USER_CACHE_TIMEOUT", 30))
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", 10000))
     
 
 SWAGGER_SETTINGS = {
@@ -197,6 +319,40 @@ SWAGGER_SETTINGS = {
 
 
 
+# Stock reservations
+# Adding an item to a cart holds its units for this long; expired holds are
+# released by `manage.py release_expired_holds` (run it from cron/a worker).
+STOCK_RESERVATION_TTL = timedelta(minutes=int(os.getenv("STOCK_RESERVATION_TTL_MINUTES", 15)))
+STOCK_RESERVATION_SWEEP_BATCH = int(os.getenv("STOCK_RESERVATION_SWEEP_BATCH", 500))
+
+
+# Instrumentation, metrics & logging
+# Per-request SQL/timing instrumentation (shop/instrumentation.py); it
+# also feeds the request metrics at /api/metrics.
+REQUEST_INSTRUMENTATION = os.getenv("REQUEST_INSTRUMENTATION", "true").lower() == "true"
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+# Identical statements per request at which an N+1 warning is logged.
+REPEATED_QUERY_THRESHOLD = int(os.getenv("REPEATED_QUERY_THRESHOLD", 10))
+# Bearer token a Prometheus scraper sends to /api/metrics (staff sessions
+# are always allowed).
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "plain": {"format": "%(asctime)s %(levelname)s %(name)s %(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "plain"},
+    },
+    "loggers": {
+        "shop": {"handlers": ["console"], "level": os.getenv("SHOP_LOG_LEVEL", "INFO")},
+    },
+}
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -1,6 +1,9 @@
+import re
+
 from django.contrib import admin
 from django.conf import settings
-from django.urls import path, include
+from django.http import HttpResponse
+from django.urls import path, include, re_path
 from django.views.generic import RedirectView
 from django.conf.urls.static import static
 from rest_framework_simplejwt.views import (
@@ -11,6 +14,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from shop.media import serve_media
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Ecommerce API",
@@ -23,7 +28,13 @@ schema_view = get_schema_view(
 )
 
 
+def healthz(request):
+    """Liveness probe: answers as soon as a worker can serve requests."""
+    return HttpResponse("ok", content_type="text/plain")
+
+
 urlpatterns = [
+    path("healthz/", healthz, name="healthz"),
     path('admin/', admin.site.urls),
     path('api/', include('shop.urls')),  
 
@@ -35,4 +46,7 @@ urlpatterns = [
     path("", RedirectView.as_view(url="/api/swagger/", permanent=False)),
 ]
 
-urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
+urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+urlpatterns += [
+    re_path(r"^%s(?P<path>.+)$" % re.escape(settings.MEDIA_URL.lstrip("/")), serve_media, name="media"),
+]
\ No newline at end of file
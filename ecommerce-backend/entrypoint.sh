@@ -1,19 +1,13 @@
 #!/bin/bash
 # entrypoint.sh
+set -e
 
-echo "Applying database migrations..."
-python manage.py migrate --noinput
-
-echo "Creating superuser if not exists..."
-python manage.py shell <<EOF
-from django.contrib.auth import get_user_model
-User = get_user_model()
-if not User.objects.filter(username="admin").exists():
-    User.objects.create_superuser("admin", "admin@example.com", "admin123")
-EOF
-
-echo "Collecting static files..."
-python manage.py collectstatic --noinput
+# Pending migrations, static files and the admin user, each skipped when
+# already in place, in a single Python process.
+python manage.py bootstrap
 
 echo "Starting Gunicorn..."
-exec gunicorn core.wsgi:application --bind 0.0.0.0:8000
+if [ "${SERVER:-wsgi}" = "asgi" ]; then
+    exec gunicorn -c gunicorn.conf.py --worker-class uvicorn_worker.UvicornWorker core.asgi:application
+fi
+exec gunicorn -c gunicorn.conf.py core.wsgi:application
@@ -0,0 +1,58 @@
+"""
+Gunicorn settings: `gunicorn -c gunicorn.conf.py core.wsgi:application`.
+
+Workers and threads are sized from the CPUs this container may use; every
+value can be overridden from the environment.
+"""
+import glob
+import os
+import tempfile
+
+
+def cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2 * cpu_count() + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread" if threads > 1 else "sync")
+
+# Import Django once in the master; workers fork with it already loaded.
+preload_app = True
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to cap slow memory growth.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = max_requests // 10
+
+
+# Workers write their metrics to files here and /api/metrics merges them
+# (prometheus_client multiprocess mode). This must be set before the app,
+# and prometheus_client with it, is imported; files of earlier runs are
+# stale and are removed.
+metrics_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "shop-metrics")
+)
+os.makedirs(metrics_dir, exist_ok=True)
+for stale in glob.glob(os.path.join(metrics_dir, "*.db")):
+    os.remove(stale)
+
+
+def child_exit(server, worker):
+    # Fold the dead worker's live values out of the merged view.
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid, metrics_dir)
+
+
+def post_fork(server, worker):
+    # Never share a database connection opened in the master.
+    from django.db import connections
+
+    connections.close_all()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Product, Cart, CartItem, Order, OrderItem
+from .models import Category, Product, Cart, CartItem, StockHold, Order, OrderItem
 
 
 @admin.register(Category)
@@ -15,6 +15,7 @@ class ProductAdmin(admin.ModelAdmin):
         "name",
         "price",
         "stock",
+        "reserved",
         "available",
         "created",
         "updated",
@@ -36,6 +37,12 @@ class CartItemAdmin(admin.ModelAdmin):
     list_filter = ("cart", "product")
 
 
+@admin.register(StockHold)
+class StockHoldAdmin(admin.ModelAdmin):
+    list_display = ("id", "product", "cart_item", "quantity", "expires_at")
+    list_select_related = ("product",)
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "status", "created_at")  # use 'created' instead of 'ordered_at'
@@ -7,3 +7,9 @@ class ShopConfig(AppConfig):
     
     def ready(self):
         import shop.signals
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+        from .instrumentation import install_query_recorder
+        from .search import install_sqlite_fts
+        post_migrate.connect(install_sqlite_fts, sender=self)
+        connection_created.connect(install_query_recorder)
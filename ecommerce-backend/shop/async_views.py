@@ -0,0 +1,203 @@
+"""
+Async versions of the public catalog reads, for ASGI deployments.
+
+They return the same payloads, validators and HTTP cache headers as the
+DRF viewsets in views.py, but every query goes through Django's async ORM,
+so under uvicorn a slow query suspends one coroutine instead of tying up a
+whole worker. Product lists accept the same filters, `?search=` and
+`?ordering=` as the sync endpoints; cursor pagination is only served by the
+sync endpoints and is rejected with a 400.
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .cache import (
+    add_http_cache_headers,
+    aget_catalog_version,
+    aqueryset_state,
+    catalog_cache,
+    make_etag,
+    not_modified_response,
+    response_cache_key,
+)
+from .metrics import record_cache
+from .models import Category, Product
+from .pagination import ProductPagination, StandardResultsSetPagination
+from .serializers import CategorySerializer, ProductSerializer
+from .views import CategoryViewSet, ProductViewSet
+
+
+NO_PRODUCT = "No Product matches the given query."
+NO_CATEGORY = "No Category matches the given query."
+
+
+class NotFound(Exception):
+    def __init__(self, detail="Not found."):
+        super().__init__(detail)
+        self.detail = detail
+
+
+def json_response(data, status=200):
+    # Compact separators, like DRF's JSONRenderer.
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={"separators": (",", ":")})
+
+
+def page_params(request, pagination_class=StandardResultsSetPagination):
+    """(page, page_size), with the page size resolved by the sync view's paginator."""
+    try:
+        page = int(request.GET.get("page") or 1)
+    except ValueError:
+        raise NotFound("Invalid page.")
+    if page < 1:
+        raise NotFound("Invalid page.")
+    return page, pagination_class().get_page_size(Request(request))
+
+
+def paginated(request, results, count, page, page_size):
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, "page", page + 1) if page * page_size < count else None
+    if page == 1:
+        previous_url = None
+    elif page == 2:
+        previous_url = remove_query_param(url, "page")
+    else:
+        previous_url = replace_query_param(url, "page", page - 1)
+    return {"count": count, "next": next_url, "previous": previous_url, "results": results}
+
+
+async def cached_json(request, etag, last_modified, build):
+    """
+    304 when the client's validators match, otherwise the cached body for
+    this URL + ETag, otherwise `await build()` (which may raise NotFound).
+    """
+    not_modified = not_modified_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    cache = catalog_cache()
+    key = response_cache_key(request, await aget_catalog_version(), etag or "")
+    cached = await cache.aget(key)
+    record_cache("catalog", cached is not None)
+    if cached is not None:
+        data, _ = cached
+        response = json_response(data)
+        response["X-Cache"] = "HIT"
+    else:
+        try:
+            data = await build()
+        except NotFound as e:
+            return json_response({"detail": e.detail}, status=404)
+        await cache.aset(key, (data, 200))
+        response = json_response(data)
+        response["X-Cache"] = "MISS"
+    return add_http_cache_headers(response, etag, last_modified)
+
+
+def cursor_requested(request):
+    return (
+        request.GET.get(ProductPagination.mode_query_param) == "cursor"
+        or ProductPagination.cursor_class.cursor_query_param in request.GET
+    )
+
+
+def filter_products(request, queryset):
+    """
+    Apply ProductViewSet's filter backends (filters, full-text search,
+    ordering) so both list endpoints select and order the same rows. They
+    only build the queryset, but the search backend may inspect the schema
+    on first use, so this runs in a thread.
+    """
+    view = ProductViewSet(request=Request(request), args=(), kwargs={}, action="list", format_kwarg=None)
+    return view.filter_queryset(queryset)
+
+
+async def list_products(request, queryset):
+    if cursor_requested(request):
+        return json_response(
+            {ProductPagination.mode_query_param: ["Cursor pagination is only served by the sync endpoints."]},
+            status=400,
+        )
+    try:
+        queryset = await sync_to_async(filter_products)(request, queryset)
+    except ValidationError as e:
+        return json_response(e.detail, status=400)
+    try:
+        page, page_size = page_params(request)
+    except NotFound as e:
+        return json_response({"detail": e.detail}, status=404)
+
+    # One aggregate serves as both the validator and the page count.
+    last_modified, count = await aqueryset_state(queryset)
+    etag = make_etag(request, "list", last_modified, count)
+
+    async def build():
+        offset = (page - 1) * page_size
+        if page > 1 and offset >= count:
+            raise NotFound("Invalid page.")
+        rows = [product async for product in queryset[offset:offset + page_size]]
+        return paginated(request, ProductSerializer(rows, many=True).data, count, page, page_size)
+
+    return await cached_json(request, etag, None, build)
+
+
+async def product_list(request):
+    return await list_products(request, Product.objects.all())
+
+
+async def product_detail(request, slug):
+    last_modified, count = await aqueryset_state(Product.objects.filter(slug=slug))
+    if not count:
+        return json_response({"detail": NO_PRODUCT}, status=404)
+    etag = make_etag(request, "retrieve", last_modified, count)
+
+    async def build():
+        product = await Product.objects.filter(slug=slug).order_by("id").afirst()
+        if product is None:
+            raise NotFound(NO_PRODUCT)
+        return ProductSerializer(product).data
+
+    return await cached_json(request, etag, last_modified, build)
+
+
+async def category_list(request):
+    try:
+        page, page_size = page_params(request, CategoryViewSet.pagination_class)
+    except NotFound as e:
+        return json_response({"detail": e.detail}, status=404)
+    # From the rows, as in the sync view: the catalog version is per process.
+    last_modified, count = await aqueryset_state(Category.objects.all())
+    etag = make_etag(request, "categories", last_modified, count)
+
+    async def build():
+        offset = (page - 1) * page_size
+        if page > 1 and offset >= count:
+            raise NotFound("Invalid page.")
+        rows = [category async for category in Category.objects.all()[offset:offset + page_size]]
+        return paginated(request, CategorySerializer(rows, many=True).data, count, page, page_size)
+
+    return await cached_json(request, etag, None, build)
+
+
+async def category_detail(request, slug):
+    last_modified, count = await aqueryset_state(Category.objects.filter(slug=slug))
+    if not count:
+        return json_response({"detail": NO_CATEGORY}, status=404)
+    etag = make_etag(request, "categories", last_modified, count)
+
+    async def build():
+        category = await Category.objects.filter(slug=slug).afirst()
+        if category is None:
+            raise NotFound(NO_CATEGORY)
+        return CategorySerializer(category).data
+
+    return await cached_json(request, etag, last_modified, build)
+
+
+async def category_products(request, slug):
+    category = await Category.objects.filter(slug=slug).afirst()
+    if category is None:
+        return json_response({"detail": NO_CATEGORY}, status=404)
+    return await list_products(request, Product.objects.filter(category=category))
@@ -0,0 +1,150 @@
+"""
+JWT authentication with an in-process cache of token users.
+
+JWTAuthentication loads the user row on every request, and views that
+render the profile load that too. CachedJWTAuthentication keeps the field
+values of recently seen users (with their profile) in a small per-process
+LRU with a TTL and rebuilds fresh instances from it, so cart and order
+requests skip both lookups.
+
+Entries are dropped on User/Profile save and delete (see signals.py).
+Other worker processes only notice when their own entry expires, so
+AUTH_USER_CACHE_TIMEOUT bounds how long a deactivation elsewhere, or a
+queryset.update() that bypasses signals, can go unseen.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .metrics import record_cache
+from .models import Profile
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries also expire after `timeout` seconds."""
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "size": len(self._data),
+            }
+
+
+user_cache = TTLCache(
+    max_entries=settings.AUTH_USER_CACHE_MAX_ENTRIES,
+    timeout=settings.AUTH_USER_CACHE_TIMEOUT,
+)
+
+
+def _field_values(instance):
+    return tuple(getattr(instance, field.attname) for field in instance._meta.concrete_fields)
+
+
+def _rebuild(model, values):
+    return model.from_db("default", [field.attname for field in model._meta.concrete_fields], values)
+
+
+def invalidate_user(user_id):
+    user_cache.delete(str(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Drop-in replacement for JWTAuthentication. Each request gets its own
+    User (and Profile) instance, rebuilt from cached field values, so a view
+    mutating request.user can't leak into concurrent requests.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        user = self.cached_user(user_id)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+    def cached_user(self, user_id):
+        # simplejwt writes the claim as a string; normalize so signal-driven
+        # invalidation (which has the integer pk) hits the same key.
+        key = str(user_id)
+        entry = user_cache.get(key)
+        record_cache("auth_user", entry is not None)
+        if entry is None:
+            try:
+                user = User.objects.select_related("profile").get(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except User.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+            try:
+                profile_values = _field_values(user.profile)
+            except Profile.DoesNotExist:
+                profile_values = None
+            user_cache.set(key, (_field_values(user), profile_values))
+            return user
+
+        user_values, profile_values = entry
+        user = _rebuild(User, user_values)
+        if profile_values is not None:
+            profile = _rebuild(Profile, profile_values)
+            profile.user = user
+        return user
@@ -0,0 +1,250 @@
+"""
+Helpers shared by the bench_* management commands.
+
+Benchmarks run against a throwaway copy of the configured database (the
+same "test_" database Django's test runner uses), so they work on SQLite
+and on a local PostgreSQL without touching real data.
+"""
+import http.client
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from types import SimpleNamespace
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from .counters import recount_categories
+from .models import Cart, CartItem, Category, Order, OrderItem, Product, Profile
+from .reservations import reserve
+
+
+@contextmanager
+def scratch_database(keepdb=False, test_name=None):
+    """
+    `test_name` overrides the test database name; for SQLite, pass a file
+    path when other processes (e.g. a benchmarked server) must open it.
+    """
+    setup_test_environment(debug=False)
+    old_name = connection.settings_dict["NAME"]
+    if test_name:
+        connection.settings_dict.setdefault("TEST", {})["NAME"] = test_name
+    connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb
+    )
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples_ms):
+    return {
+        "runs": len(samples_ms),
+        "mean_ms": round(statistics.fmean(samples_ms), 3) if samples_ms else 0.0,
+        "p50_ms": round(percentile(samples_ms, 50), 3),
+        "p95_ms": round(percentile(samples_ms, 95), 3),
+        "p99_ms": round(percentile(samples_ms, 99), 3),
+        "max_ms": round(max(samples_ms), 3) if samples_ms else 0.0,
+    }
+
+
+def database_url(settings_dict):
+    """DATABASE_URL for the given connection settings (SQLite / PostgreSQL)."""
+    engine = settings_dict["ENGINE"]
+    if engine.endswith("sqlite3"):
+        return f"sqlite:///{settings_dict['NAME']}"
+    if "postgresql" in engine:
+        credentials = quote(settings_dict.get("USER") or "")
+        if settings_dict.get("PASSWORD"):
+            credentials += ":" + quote(settings_dict["PASSWORD"])
+        host = settings_dict.get("HOST") or "localhost"
+        if settings_dict.get("PORT"):
+            host += f":{settings_dict['PORT']}"
+        return f"postgres://{credentials}@{host}/{settings_dict['NAME']}"
+    raise ValueError(f"Unsupported database engine {engine}")
+
+
+@contextmanager
+def gunicorn_server(application, port, env, ready_path, *args):
+    """
+    Run `application` under gunicorn on 127.0.0.1:`port` (extra command
+    line `args`, e.g. worker options) for the duration of the block, once
+    `ready_path` answers 200.
+    """
+    command = [
+        sys.executable, "-m", "gunicorn", application,
+        "--bind", f"127.0.0.1:{port}",
+        "--log-level", "warning",
+        *args,
+    ]
+    server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+    try:
+        wait_until_ready(port, ready_path, server)
+        yield server
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def wait_until_ready(port, path, server, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with status {server.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", path)
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+
+def run_load(port, paths, total, concurrency):
+    """
+    GET `paths` round robin, `total` requests over `concurrency` keep-alive
+    connections. Returns (requests per second, latency summary, errors).
+    """
+    counter = iter(range(total))
+    lock = threading.Lock()
+    samples, errors = [], []
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            start = time.perf_counter()
+            try:
+                conn.request("GET", paths[i % len(paths)], headers={"Accept": "application/json"})
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                (samples if ok else errors).append(elapsed)
+        conn.close()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return len(samples) / elapsed, summarize(samples), len(errors)
+
+
+@contextmanager
+def measure():
+    """
+    Time a block and count the SQL it runs:
+
+        with measure() as m:
+            client.get(...)
+        m.elapsed_ms, m.queries
+    """
+    result = SimpleNamespace()
+    with CaptureQueriesContext(connection) as ctx:
+        start = time.perf_counter()
+        yield result
+        result.elapsed_ms = (time.perf_counter() - start) * 1000
+    result.queries = len(ctx.captured_queries)
+
+
+WORDS = (
+    "classic", "compact", "deluxe", "eco", "ergonomic", "lightweight", "organic",
+    "portable", "premium", "rugged", "smart", "vintage", "wireless", "waterproof",
+    "bag", "bottle", "cable", "chair", "charger", "desk", "headphones", "jacket",
+    "kettle", "lamp", "mug", "notebook", "shoes", "speaker", "watch", "backpack",
+)
+
+
+def seed_catalog(categories=20, products=5000, users=100, orders_per_user=5, cart_items=3, seed=0):
+    """
+    Fill the (scratch) database with a reproducible shop: the same
+    arguments and seed always give the same rows, so runs can be compared.
+    Each user gets an active cart of `cart_items` reserved items and
+    `orders_per_user` past orders. Returns the created categories,
+    products and users.
+    """
+    rng = random.Random(seed)
+    category_rows = Category.objects.bulk_create(
+        Category(name=f"Category {i}", slug=f"category-{i}") for i in range(categories)
+    )
+    product_rows = []
+    for i in range(products):
+        name = " ".join(rng.sample(WORDS, 3)) + f" {i}"
+        product_rows.append(Product(
+            category=rng.choice(category_rows),
+            name=name.capitalize(),
+            slug=f"product-{i}",
+            description=f"{name} " + " ".join(rng.choices(WORDS, k=12)),
+            price=Decimal(rng.randrange(100, 50000)) / 100,
+            # Mostly well stocked, with a tail of sold-out products.
+            stock=0 if rng.random() < 0.1 else rng.randrange(1, 500),
+        ))
+    product_rows = Product.objects.bulk_create(product_rows, batch_size=1000)
+    recount_categories()
+
+    password = make_password("bench")
+    user_rows = User.objects.bulk_create(
+        User(username=f"bench-user-{i}", password=password) for i in range(users)
+    )
+    Profile.objects.bulk_create(Profile(user=user) for user in user_rows)
+
+    in_stock = [product for product in product_rows if product.stock >= 100]
+    orders = []
+    for user in user_rows:
+        for _ in range(orders_per_user):
+            orders.append(Order(user=user, status=rng.choice(["pending", "shipped", "delivered"])))
+    orders = Order.objects.bulk_create(orders, batch_size=1000)
+    order_items = []
+    for order in orders:
+        lines = [
+            OrderItem(order=order, product=product, quantity=rng.randrange(1, 4), price=product.price)
+            for product in rng.sample(product_rows, rng.randrange(1, 5))
+        ]
+        order.total = sum(line.price * line.quantity for line in lines)
+        order.item_count = sum(line.quantity for line in lines)
+        order_items.extend(lines)
+    OrderItem.objects.bulk_create(order_items, batch_size=1000)
+    Order.objects.bulk_update(orders, ["total", "item_count"], batch_size=1000)
+
+    carts = Cart.objects.bulk_create(Cart(user=user) for user in user_rows)
+    for cart in carts:
+        for product in rng.sample(in_stock, min(cart_items, len(in_stock))):
+            reserve(CartItem.objects.create(cart=cart, product=product), 1)
+
+    return SimpleNamespace(categories=category_rows, products=product_rows, users=user_rows)
@@ -0,0 +1,203 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .metrics import record_cache
+
+
+CATALOG_CACHE_ALIAS = "catalog"
+CATALOG_VERSION_KEY = "shop:catalog:version"
+
+
+def catalog_cache():
+    return caches[CATALOG_CACHE_ALIAS]
+
+
+def get_catalog_version():
+    cache = catalog_cache()
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Seed from the clock rather than 1: if the counter is ever evicted,
+        # the new value can't collide with versions baked into older keys.
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+async def aget_catalog_version():
+    cache = catalog_cache()
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = await cache.aget(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached catalog response. Called from the Product /
+    Category post_save and post_delete signals; code paths that bypass
+    signals (bulk_update, queryset.update) must call it themselves.
+    """
+    cache = catalog_cache()
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def normalized_query(request):
+    """
+    Canonical form of the query string: keys and repeated values sorted,
+    empty parameters dropped, so `?b=2&a=1` and `?a=1&b=2&c=` share a key.
+    """
+    query = getattr(request, "query_params", request.GET)
+    params = sorted(
+        (key, sorted(value for value in values if value != ""))
+        for key, values in query.lists()
+    )
+    return urlencode([(key, value) for key, values in params for value in values])
+
+
+def renderer_format(request):
+    """DRF's negotiated format; plain Django (async) views only serve JSON."""
+    renderer = getattr(request, "accepted_renderer", None)
+    return renderer.format if renderer is not None else "json"
+
+
+def response_cache_key(request, version, etag=""):
+    raw = "|".join([
+        request.get_host(),
+        request.path,
+        renderer_format(request),
+        normalized_query(request),
+        etag,
+    ])
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f"shop:response:{version}:{digest}"
+
+
+def make_etag(request, *parts):
+    raw = "|".join([
+        request.path,
+        normalized_query(request),
+        renderer_format(request),
+        *(str(part) for part in parts),
+    ])
+    return '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+
+def queryset_state(queryset, field="updated"):
+    """
+    (latest `field`, row count) over `queryset` in one aggregate query.
+    Any insert, delete or save of a matching row changes one of the two.
+    """
+    stats = queryset.order_by().aggregate(last=Max(field), count=Count("pk"))
+    return stats["last"], stats["count"]
+
+
+async def aqueryset_state(queryset, field="updated"):
+    stats = await queryset.order_by().aaggregate(last=Max(field), count=Count("pk"))
+    return stats["last"], stats["count"]
+
+
+def add_http_cache_headers(response, etag, last_modified):
+    if etag:
+        response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=settings.CATALOG_HTTP_MAX_AGE,
+        s_maxage=settings.CATALOG_PROXY_MAX_AGE,
+    )
+    patch_vary_headers(response, ("Accept",))
+    return response
+
+
+def not_modified_response(request, etag, last_modified):
+    """A 304 (or 412) response if the request's validators match, else None."""
+    if not (etag or last_modified):
+        return None
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is not None:
+        add_http_cache_headers(response, etag, last_modified)
+    return response
+
+
+class CatalogCacheMixin:
+    """
+    Cache the serialized data of safe catalog reads, and answer conditional
+    GETs from validators before any serialization happens.
+
+    Entries live in the `catalog` cache alias, keyed by the catalog version
+    plus the request path and normalized query string (filters, search,
+    ordering, page/cursor). Size is bounded by that cache: LocMemCache's
+    MAX_ENTRIES culls least recently used keys, and a shared Redis should
+    run with `maxmemory-policy allkeys-lru`.
+
+    Views provide validators through get_validators(); the ETag is folded
+    into the cache key too, so a cached body always matches its ETag.
+    """
+
+    cached_actions = ("list", "retrieve")
+    # Only JSON is cached; the browsable API embeds per-user markup.
+    cached_formats = ("json",)
+
+    def should_cache_response(self, request):
+        return (
+            request.method == "GET"
+            and self.action in self.cached_actions
+            and request.accepted_renderer.format in self.cached_formats
+        )
+
+    def get_validators(self, request, *args, **kwargs):
+        """
+        (etag, last_modified) for the current read, or None to skip
+        conditional handling. `last_modified` is a datetime or None.
+        """
+        return None
+
+    def dispatch_cached(self, handler, request, *args, **kwargs):
+        if not self.should_cache_response(request):
+            return handler(request, *args, **kwargs)
+
+        etag, last_modified = self.get_validators(request, *args, **kwargs) or (None, None)
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        cache = catalog_cache()
+        key = response_cache_key(request, get_catalog_version(), etag or "")
+        cached = cache.get(key)
+        record_cache("catalog", cached is not None)
+        if cached is not None:
+            data, status_code = cached
+            response = Response(data, status=status_code)
+            response["X-Cache"] = "HIT"
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, (response.data, response.status_code))
+            response["X-Cache"] = "MISS"
+        if response.status_code == 200:
+            add_http_cache_headers(response, etag, last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.dispatch_cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.dispatch_cached(super().retrieve, request, *args, **kwargs)
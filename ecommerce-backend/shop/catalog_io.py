@@ -0,0 +1,263 @@
+"""
+Streaming CSV / JSON Lines import and export of the product catalog.
+
+Both directions work a chunk at a time, so memory stays flat no matter how
+large the file is: export iterates the queryset with a server-side cursor,
+import reads, validates and upserts `chunk_size` rows per transaction.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import DecimalValidator
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .cache import bump_catalog_version
+from .counters import recount_categories
+from .models import Category, Product
+
+
+EXPORT_FIELDS = ["slug", "name", "description", "price", "stock", "available", "category"]
+FORMATS = ("csv", "jsonl")
+TRUE_VALUES = {"1", "true", "t", "yes", "y"}
+FALSE_VALUES = {"0", "false", "f", "no", "n", ""}
+
+
+def detect_format(path, default="csv"):
+    if path.endswith(".jsonl") or path.endswith(".ndjson"):
+        return "jsonl"
+    if path.endswith(".csv"):
+        return "csv"
+    return default
+
+
+# -----------------------
+# Export
+# -----------------------
+
+def export_rows(queryset, chunk_size=2000):
+    """Yield one plain dict per product, reading `chunk_size` rows at a time."""
+    rows = (
+        queryset.order_by("id")
+        .values_list("slug", "name", "description", "price", "stock", "available", "category__slug")
+        .iterator(chunk_size=chunk_size)
+    )
+    for row in rows:
+        yield dict(zip(EXPORT_FIELDS, row))
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.DictWriter(_Echo(), fieldnames=EXPORT_FIELDS)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, default=str) + "\n"
+
+
+def export_lines(rows, file_format):
+    return csv_lines(rows) if file_format == "csv" else jsonl_lines(rows)
+
+
+# -----------------------
+# Import
+# -----------------------
+
+def read_rows(stream, file_format):
+    """Yield (line_number, dict) pairs from a text stream."""
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, e
+            continue
+        yield line_number, row
+
+
+class RowError(ValueError):
+    pass
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise RowError(f"invalid boolean {value!r}")
+
+
+class ProductImporter:
+    """
+    Upsert products by slug in fixed-size chunks.
+
+    Categories are resolved through an in-memory slug -> id map loaded once
+    (and extended when `create_categories` is set). Slugs missing from the
+    input are generated from the name with slugify(), as the API does.
+    Signals don't fire for bulk writes, so category counters and the
+    catalog cache are refreshed once at the end.
+    """
+
+    # bulk_update() doesn't apply auto_now, so `updated` is set explicitly.
+    update_fields = ["name", "description", "price", "stock", "available", "category", "updated"]
+
+    def __init__(self, chunk_size=1000, create_categories=False, dry_run=False, on_error=None):
+        self.chunk_size = chunk_size
+        self.create_categories = create_categories
+        self.dry_run = dry_run
+        # Errors are reported as they happen rather than collected, so a
+        # bad multi-million-row file can't grow memory either.
+        self.on_error = on_error
+        self.categories = dict(Category.objects.values_list("slug", "id"))
+        self.touched_categories = set()
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+
+    def run(self, rows):
+        chunk = {}
+        for line_number, row in rows:
+            try:
+                product = self.build(row)
+            except (RowError, AttributeError, TypeError) as e:
+                self.failed += 1
+                if self.on_error:
+                    self.on_error(line_number, str(e))
+                continue
+            # Last occurrence of a slug within a chunk wins.
+            chunk[product.slug] = product
+            if len(chunk) >= self.chunk_size:
+                self.flush(chunk)
+                chunk = {}
+        if chunk:
+            self.flush(chunk)
+        self.finish()
+        return self
+
+    def build(self, row):
+        if isinstance(row, Exception):
+            raise RowError(f"invalid JSON: {row}")
+        name = (row.get("name") or "").strip()
+        if not name:
+            raise RowError("name is required")
+        slug = (row.get("slug") or "").strip() or slugify(name)
+        self.check_length("name", name)
+        self.check_length("slug", slug)
+        price = self.parse_price(row.get("price", ""))
+        try:
+            stock = int(row.get("stock") or 0)
+        except ValueError:
+            raise RowError(f"invalid stock {row.get('stock')!r}")
+        if stock < 0:
+            raise RowError("stock must not be negative")
+        available = _parse_bool(row.get("available", True))
+        category_id = self.resolve_category((row.get("category") or "").strip())
+        return Product(
+            slug=slug,
+            name=name,
+            description=row.get("description") or "",
+            price=price,
+            stock=stock,
+            available=available,
+            category_id=category_id,
+        )
+
+    @staticmethod
+    def check_length(field_name, value):
+        max_length = Product._meta.get_field(field_name).max_length
+        if len(value) > max_length:
+            raise RowError(f"{field_name} is longer than {max_length} characters")
+
+    @staticmethod
+    def parse_price(value):
+        """
+        A Decimal the price column can store as is. bulk_create would only
+        fail on it after earlier chunks were committed, so check here.
+        """
+        try:
+            price = Decimal(str(value).strip())
+        except InvalidOperation:
+            raise RowError(f"invalid price {value!r}")
+        if not price.is_finite():
+            raise RowError(f"invalid price {value!r}")
+        if price < 0:
+            raise RowError("price must not be negative")
+        field = Product._meta.get_field("price")
+        try:
+            DecimalValidator(field.max_digits, field.decimal_places)(price)
+        except ValidationError as e:
+            raise RowError(f"invalid price {value!r}: {e.messages[0]}")
+        return price
+
+    def resolve_category(self, slug):
+        if not slug:
+            raise RowError("category is required")
+        if slug not in self.categories:
+            if not self.create_categories:
+                raise RowError(f"unknown category {slug!r}")
+            if self.dry_run:
+                self.categories[slug] = None
+            else:
+                category, _ = Category.objects.get_or_create(
+                    slug=slug, defaults={"name": slug.replace("-", " ").title()}
+                )
+                self.categories[slug] = category.id
+        return self.categories[slug]
+
+    def flush(self, chunk):
+        existing = {}
+        for product_id, slug, category_id in (
+            Product.objects.filter(slug__in=chunk.keys())
+            .order_by("-id")
+            .values_list("id", "slug", "category_id")
+        ):
+            # Slugs aren't unique in the schema; update the oldest match.
+            existing[slug] = (product_id, category_id)
+
+        now = timezone.now()
+        to_create, to_update = [], []
+        for slug, product in chunk.items():
+            if slug in existing:
+                product.pk, old_category_id = existing[slug]
+                product.updated = now
+                self.touched_categories.add(old_category_id)
+                to_update.append(product)
+            else:
+                to_create.append(product)
+            self.touched_categories.add(product.category_id)
+
+        if not self.dry_run:
+            with transaction.atomic():
+                Product.objects.bulk_create(to_create)
+                Product.objects.bulk_update(to_update, self.update_fields)
+        self.created += len(to_create)
+        self.updated += len(to_update)
+
+    def finish(self):
+        if self.dry_run or not (self.created or self.updated):
+            return
+        recount_categories(self.touched_categories - {None})
+        bump_catalog_version()
@@ -0,0 +1,73 @@
+from collections import defaultdict
+
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Now
+
+from .models import Category, Product
+
+
+def count_state(product):
+    """(category_id, in_stock) as it contributes to Category counters."""
+    return product.category_id, product.in_stock
+
+
+def state_deltas(before, after):
+    """
+    Counter changes for one product moving from `before` to `after`
+    (either may be None for create/delete), as
+    {category_id: [product_delta, in_stock_delta]}.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    if before is not None:
+        category_id, in_stock = before
+        deltas[category_id][0] -= 1
+        deltas[category_id][1] -= int(in_stock)
+    if after is not None:
+        category_id, in_stock = after
+        deltas[category_id][0] += 1
+        deltas[category_id][1] += int(in_stock)
+    return deltas
+
+
+def _delta_case(deltas, index):
+    whens = [
+        When(id=category_id, then=Value(delta[index]))
+        for category_id, delta in deltas.items()
+        if delta[index]
+    ]
+    return Case(*whens, default=Value(0), output_field=IntegerField())
+
+
+def apply_category_deltas(deltas):
+    """Apply {category_id: [product_delta, in_stock_delta]} in one UPDATE."""
+    deltas = {category_id: delta for category_id, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    Category.objects.filter(id__in=deltas).update(
+        product_count=F("product_count") + _delta_case(deltas, 0),
+        in_stock_count=F("in_stock_count") + _delta_case(deltas, 1),
+        # update() doesn't apply auto_now; category ETags are derived from it.
+        updated=Now(),
+    )
+
+
+def recount_categories(category_ids=None):
+    """
+    Recompute counters from scratch. Used to backfill and to repair drift
+    after writes that bypass the model signals (raw SQL, queryset.update).
+    """
+    products = Product.objects.filter(category=OuterRef("pk")).order_by().values("category")
+    total = products.annotate(n=Count("id")).values("n")
+    in_stock = (
+        products.filter(Q(stock__gt=F("reserved")) & Q(available=True))
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    categories = Category.objects.all()
+    if category_ids is not None:
+        categories = categories.filter(id__in=category_ids)
+    return categories.update(
+        product_count=Coalesce(Subquery(total), 0),
+        in_stock_count=Coalesce(Subquery(in_stock), 0),
+        updated=Now(),
+    )
@@ -0,0 +1,77 @@
+"""
+Facet counts for the product listing sidebar.
+
+product_facets() answers "how many products per category, how many in
+stock, and how many per price range" for an already filtered/searched
+queryset with a single GROUP BY category query: every other count is a
+conditional COUNT in the same pass, and the totals are summed from the
+per-category rows. Counts follow the whole current selection, including
+any category filter.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, F, Q
+from rest_framework.exceptions import ValidationError
+
+
+MAX_PRICE_BUCKETS = 20
+
+
+def parse_price_buckets(value):
+    """
+    Bucket boundaries from `?price_buckets=10,50,100`, else the
+    PRODUCT_FACET_PRICE_BUCKETS setting. N boundaries make N + 1 buckets.
+    """
+    if not value:
+        return list(settings.PRODUCT_FACET_PRICE_BUCKETS)
+    try:
+        parts = [Decimal(part) for part in value.split(",") if part.strip()]
+        # NaN and sNaN parse, but can't be compared (or, sNaN, hashed).
+        if not all(part.is_finite() for part in parts):
+            raise InvalidOperation
+        edges = sorted(set(parts))
+    except (InvalidOperation, TypeError):
+        raise ValidationError({"price_buckets": ["Expected comma-separated prices, e.g. 25,50,100."]})
+    if not edges or len(edges) > MAX_PRICE_BUCKETS or edges[0] < 0:
+        raise ValidationError(
+            {"price_buckets": [f"Give between 1 and {MAX_PRICE_BUCKETS} non-negative prices."]}
+        )
+    return edges
+
+
+def product_facets(queryset, edges):
+    # Same test as `?in_stock=true`, so the count matches that listing.
+    in_stock = Q(stock__gt=F("reserved"))
+    ranges = list(zip([None, *edges], [*edges, None]))
+    aggregates = {"count": Count("id"), "in_stock": Count("id", filter=in_stock)}
+    for i, (low, high) in enumerate(ranges):
+        bucket = Q()
+        if low is not None:
+            bucket &= Q(price__gte=low)
+        if high is not None:
+            bucket &= Q(price__lt=high)
+        aggregates[f"price_{i}"] = Count("id", filter=bucket)
+
+    rows = list(
+        queryset.order_by()
+        .values("category__slug", "category__name")
+        .annotate(**aggregates)
+        .order_by("-count", "category__name")
+    )
+    return {
+        "count": sum(row["count"] for row in rows),
+        "in_stock": sum(row["in_stock"] for row in rows),
+        "categories": [
+            {"slug": row["category__slug"], "name": row["category__name"], "count": row["count"]}
+            for row in rows
+        ],
+        "price": [
+            {
+                "min": str(low) if low is not None else None,
+                "max": str(high) if high is not None else None,
+                "count": sum(row[f"price_{i}"] for row in rows),
+            }
+            for i, (low, high) in enumerate(ranges)
+        ],
+    }
@@ -0,0 +1,145 @@
+"""
+Resized WebP/JPEG variants of product images.
+
+Uploading an image only stores the original; the generate_image_variants
+command (cron, or a long-lived worker with --interval) picks up products
+whose `image_variants` is NULL and writes one WebP and one JPEG per size in
+VARIANTS. Nothing is resized inside a request.
+
+Variant files are named after the SHA-256 of their bytes, so a name never
+changes meaning: it can be cached forever, regenerating an unchanged image
+rewrites nothing, and identical outputs are stored once. The results are
+saved with a conditional UPDATE on the source name, so a product whose
+image was replaced in the meantime is left for the next pass.
+"""
+import hashlib
+import logging
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.functions import Now
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .cache import bump_catalog_version
+from .models import Product
+
+
+logger = logging.getLogger(__name__)
+
+# name: longest side in pixels. Smaller sources are not upscaled.
+VARIANTS = {
+    "thumbnail": 150,
+    "card": 400,
+    "full": 1200,
+}
+
+VARIANT_DIR = "products/variants"
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+
+def _encode(image, fmt):
+    buffer = BytesIO()
+    if fmt == "webp":
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=6)
+    else:
+        if image.mode != "RGB":
+            # JPEG has no alpha: flatten onto white rather than black.
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A") if "A" in image.getbands() else None)
+            image = background
+        image.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _store(data, ext, storage):
+    name = f"{VARIANT_DIR}/{hashlib.sha256(data).hexdigest()[:16]}.{ext}"
+    if not storage.exists(name):
+        storage.save(name, ContentFile(data))
+    return name
+
+
+def render_variants(source, storage=None):
+    """
+    Write the variants of the image stored at `source` and return
+    {"source": source, "<variant>": {"webp": name, "jpeg": name,
+    "width": w, "height": h}, ...}.
+    """
+    storage = storage or default_storage
+    with storage.open(source, "rb") as f:
+        with Image.open(f) as original:
+            # Apply the camera's orientation tag before it is lost.
+            original = ImageOps.exif_transpose(original)
+            has_alpha = original.mode in ("RGBA", "LA", "PA") or "transparency" in original.info
+            original = original.convert("RGBA" if has_alpha else "RGB")
+
+    variants = {"source": source}
+    for name, size in VARIANTS.items():
+        image = original.copy()
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        variants[name] = {
+            "webp": _store(_encode(image, "webp"), "webp", storage),
+            "jpeg": _store(_encode(image, "jpeg"), "jpg", storage),
+            "width": image.width,
+            "height": image.height,
+        }
+    return variants
+
+
+def generate_variants(product, storage=None):
+    """
+    Render and save the variants for `product`'s current image. Returns
+    True if they were saved, False if there is no (readable) image or it
+    changed while rendering.
+    """
+    source = product.image.name if product.image else ""
+    if not source:
+        return False
+    try:
+        variants = render_variants(source, storage)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        logger.warning("Could not render variants for product %s from %s", product.pk, source, exc_info=True)
+        # Recorded so the sweep doesn't retry a broken upload forever.
+        variants = {"source": source, "error": True}
+
+    with transaction.atomic():
+        saved = Product.objects.filter(pk=product.pk, image=source).update(
+            image_variants=variants, updated=Now()
+        )
+        if saved:
+            transaction.on_commit(bump_catalog_version)
+    return bool(saved) and "error" not in variants
+
+
+def pending_products():
+    return Product.objects.exclude(image="").filter(image__isnull=False, image_variants__isnull=True)
+
+
+def generate_pending_variants(batch_size=50, storage=None):
+    """
+    Generate variants for up to `batch_size` products still without them.
+    Returns (products processed, products whose variants were saved).
+    """
+    products = list(pending_products().only("id", "image").order_by("id")[:batch_size])
+    generated = sum(generate_variants(product, storage) for product in products)
+    return len(products), generated
+
+
+def variant_urls(product, storage=None):
+    """The serializer shape: {"<variant>": {"webp": url, "jpeg": url, "width", "height"}}."""
+    variants = product.image_variants
+    if not variants or "error" in variants or variants.get("source") != (product.image.name or ""):
+        return None
+    storage = storage or default_storage
+    return {
+        name: {
+            "webp": storage.url(variant["webp"]),
+            "jpeg": storage.url(variant["jpeg"]),
+            "width": variant["width"],
+            "height": variant["height"],
+        }
+        for name, variant in variants.items()
+        if name in VARIANTS
+    }
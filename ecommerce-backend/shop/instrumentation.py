@@ -0,0 +1,255 @@
+"""
+Per-request SQL and timing instrumentation.
+
+RequestInstrumentationMiddleware makes a RequestMetrics current for the
+duration of each request, and an execute_wrapper installed on every
+database connection feeds it (no DEBUG query log needed). It records:
+
+- the number of SQL queries and their total time,
+- time spent serializing (serializers mixing in TimedSerializerMixin),
+- time spent in the view, and in rendering the response.
+
+The numbers go out as a `Server-Timing` header (visible in browser dev
+tools) and as one JSON log line on the `shop.requests` logger. Queries
+slower than SLOW_QUERY_MS are logged on `shop.sql`, as are statements
+run REPEATED_QUERY_THRESHOLD or more times in one request, the usual
+sign of an N+1 pattern.
+
+Each request is also recorded in the Prometheus metrics (metrics.py) by
+route name.
+
+The per-query cost is two perf_counter() calls and a dict update, which
+is small enough to leave on in production.
+"""
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import record_request, route_name
+
+
+logger = logging.getLogger("shop.requests")
+sql_logger = logging.getLogger("shop.sql")
+
+_current = ContextVar("shop_request_metrics", default=None)
+
+
+def current_metrics():
+    """The RequestMetrics of the request being served, or None."""
+    return _current.get()
+
+
+class RequestMetrics:
+    """Counters for one request; also the execute_wrapper that feeds them."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_name = None
+        self.route = "unmatched"
+        self.queries = 0
+        self.db_ms = 0.0
+        self.serialize_ms = 0.0
+        self.serializing = False
+        self.view_started = None
+        self.view_finished = None
+        self.slow_queries = 0
+        self.statements = {}
+        self.slow_query_ms = settings.SLOW_QUERY_MS
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.queries += 1
+            self.db_ms += elapsed
+            # `sql` still has its placeholders, so the same query shape with
+            # different parameters counts as a repeat.
+            self.statements[sql] = self.statements.get(sql, 0) + 1
+            if elapsed >= self.slow_query_ms:
+                self.slow_queries += 1
+                sql_logger.warning(
+                    "Slow query (%.1f ms) in %s: %s", elapsed, self.view_name or "-", sql[:2000]
+                )
+
+    def repeated_statements(self):
+        threshold = settings.REPEATED_QUERY_THRESHOLD
+        return {sql: count for sql, count in self.statements.items() if count >= threshold}
+
+    def timings(self, finished):
+        """Milliseconds spent in the app, view, render, serializers and database."""
+        app_ms = (finished - self.started) * 1000
+        if self.view_started is None:
+            view_ms, render_ms = app_ms, 0.0
+        else:
+            view_end = self.view_finished or finished
+            view_ms = (view_end - self.view_started) * 1000
+            render_ms = (finished - view_end) * 1000 if self.view_finished else 0.0
+        return {
+            "app": app_ms,
+            "view": view_ms,
+            "render": render_ms,
+            "serialize": self.serialize_ms,
+            "db": self.db_ms,
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper that feeds the current request's metrics, if any."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    connection_created receiver: keep record_query on every connection
+    for its lifetime. Queries then count on whichever thread runs them;
+    the async ORM uses a connection of its own on a sync_to_async thread,
+    which the context variable reaches but a wrapper installed on the
+    request thread's connection would not.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedSerializerMixin:
+    """
+    Adds the time spent in to_representation() to the current request's
+    serializer time. Nested serializers only count once, through the
+    outermost one.
+    """
+
+    def to_representation(self, instance):
+        metrics = _current.get()
+        if metrics is None or metrics.serializing:
+            return super().to_representation(instance)
+        metrics.serializing = True
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serialize_ms += (time.perf_counter() - start) * 1000
+            metrics.serializing = False
+
+
+def response_size(response):
+    if not response.streaming:
+        return len(response.content)
+    if response.has_header("Content-Length"):
+        return int(response["Content-Length"])
+    return None
+
+
+class RequestInstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Coroutine hooks, so the ASGI handler doesn't run them in a thread.
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.REQUEST_INSTRUMENTATION:
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not settings.REQUEST_INSTRUMENTATION:
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.view_started(request)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; mark the split.
+        self.view_finished()
+        return response
+
+    # In async mode the process_* names point at these, so they must not
+    # call back through them.
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self.view_started(request)
+
+    async def aprocess_template_response(self, request, response):
+        self.view_finished()
+        return response
+
+    @staticmethod
+    def view_started(request):
+        metrics = _current.get()
+        if metrics is not None:
+            match = request.resolver_match
+            metrics.view_name = match.view_name if match else None
+            metrics.route = route_name(match)
+            metrics.view_started = time.perf_counter()
+
+    @staticmethod
+    def view_finished():
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view_finished = time.perf_counter()
+
+    def finish(self, request, response, metrics):
+        timings = metrics.timings(time.perf_counter())
+        view_name = metrics.view_name or "-"
+        record_request(
+            request.method,
+            metrics.route,
+            response.status_code,
+            timings["app"] / 1000,
+            response_size(response),
+            metrics.queries,
+        )
+
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = ", ".join([
+                f'db;dur={timings["db"]:.1f};desc="{metrics.queries} queries"',
+                f'serialize;dur={timings["serialize"]:.1f}',
+                f'view;dur={timings["view"]:.1f}',
+                f'render;dur={timings["render"]:.1f}',
+                f'app;dur={timings["app"]:.1f}',
+            ])
+
+        repeated = metrics.repeated_statements()
+        for sql, count in repeated.items():
+            sql_logger.warning("Possible N+1 in %s: %d identical queries: %s", view_name, count, sql[:2000])
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                "method": request.method,
+                "path": request.path,
+                "view": view_name,
+                "status": response.status_code,
+                "queries": metrics.queries,
+                "slow_queries": metrics.slow_queries,
+                "repeated_queries": max(repeated.values(), default=0),
+                **{f"{name}_ms": round(value, 2) for name, value in timings.items()},
+            }, separators=(",", ":")))
+        return response
@@ -0,0 +1,107 @@
+import os
+import tempfile
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from shop.benchmarks import database_url, gunicorn_server, run_load, scratch_database
+from shop.counters import recount_categories
+from shop.models import Category, Product
+
+
+SERVERS = {
+    # name: (application, worker class, URL prefix of the catalog reads)
+    "wsgi": ("core.wsgi:application", "sync", "/api"),
+    "asgi": ("core.asgi:application", "uvicorn_worker.UvicornWorker", "/api/async"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare catalog read throughput and tail latency of the sync DRF "
+        "views under gunicorn (WSGI) with the async views under uvicorn "
+        "workers (ASGI), at the same worker count, against a seeded scratch "
+        "database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--servers", nargs="+", choices=sorted(SERVERS), default=["wsgi", "asgi"])
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--concurrency", type=int, default=32, help="Client connections.")
+        parser.add_argument("--requests", type=int, default=2000, help="Measured requests per server.")
+        parser.add_argument("--warmup", type=int, default=100)
+        parser.add_argument("--products", type=int, default=1000)
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--response-cache",
+            action="store_true",
+            help="Leave the catalog response cache on (by default it is disabled "
+                 "so every request reaches the database).",
+        )
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            test_name = None
+            if connection.vendor == "sqlite":
+                # The servers run in other processes, so the scratch database
+                # can't be in memory.
+                test_name = os.path.join(tmp, "bench.sqlite3")
+            with scratch_database(test_name=test_name):
+                self.seed(options["products"])
+                env = dict(os.environ, DATABASE_URL=database_url(connection.settings_dict))
+                if not options["response_cache"]:
+                    env["CATALOG_CACHE_TIMEOUT"] = "0"
+                connection.close()
+
+                self.stdout.write(
+                    f"{options['workers']} workers, {options['concurrency']} connections, "
+                    f"{options['requests']} requests\n"
+                )
+                self.stdout.write(
+                    f"{'server':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+                    f"{'p99 ms':>9} {'max ms':>9} {'errors':>7}"
+                )
+                for name in options["servers"]:
+                    rps, stats, errors = self.run_server(name, env, options)
+                    self.stdout.write(
+                        f"{name:>6} {rps:>9.1f} {stats['p50_ms']:>9} {stats['p95_ms']:>9} "
+                        f"{stats['p99_ms']:>9} {stats['max_ms']:>9} {errors:>7}"
+                    )
+
+    def seed(self, count):
+        categories = Category.objects.bulk_create(
+            Category(name=f"Bench {i}", slug=f"bench-{i}") for i in range(10)
+        )
+        Product.objects.bulk_create(
+            Product(
+                category=categories[i % len(categories)],
+                name=f"Bench product {i}",
+                slug=f"bench-product-{i}",
+                description="Benchmark product",
+                price=Decimal("1.00") + i % 500,
+                stock=i % 7,
+            )
+            for i in range(count)
+        )
+        recount_categories()
+        self.paths = (
+            [f"/products/?page={page}" for page in range(1, 11)]
+            + ["/products/?ordering=price&in_stock=true", "/products/?category=bench-3"]
+            + [f"/products/bench-product-{i}/" for i in range(0, count, max(1, count // 20))]
+            + ["/categories/", "/categories/bench-1/", "/categories/bench-2/products/?page=2"]
+        )
+
+    def run_server(self, name, env, options):
+        application, worker_class, prefix = SERVERS[name]
+        paths = [prefix + path for path in self.paths]
+        try:
+            with gunicorn_server(
+                application, options["port"], env, paths[0],
+                "--workers", str(options["workers"]),
+                "--worker-class", worker_class,
+            ):
+                run_load(options["port"], paths, options["warmup"], options["concurrency"])
+                return run_load(options["port"], paths, options["requests"], options["concurrency"])
+        except RuntimeError as e:
+            raise CommandError(str(e))
@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+
+from shop.benchmarks import scratch_database, measure
+from shop.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = "Benchmark POST /api/products/batch/ throughput for creates and price/stock updates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+        parser.add_argument("--distinct-prices", action="store_true",
+                            help="Give every updated row its own price (worst case for grouping)")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            admin = User.objects.create_superuser("bench", "bench@example.com", "x")
+            self.client = APIClient()
+            self.client.force_authenticate(admin)
+            self.category = Category.objects.create(name="Bench", slug="bench")
+
+            self.stdout.write(
+                f"{'rows':>7} {'kind':>7} {'queries':>8} {'seconds':>8} {'rows/s':>9}"
+            )
+            for rows in options["rows"]:
+                creates = [
+                    {
+                        "name": f"Bench {rows}/{i}",
+                        "price": "9.99",
+                        "stock": 5,
+                        "category": self.category.id,
+                    }
+                    for i in range(rows)
+                ]
+                self.report(rows, "create", creates)
+
+                ids = Product.objects.filter(name__startswith=f"Bench {rows}/").values_list("id", flat=True)
+                updates = [
+                    {
+                        "id": product_id,
+                        "price": str(Decimal("10.00") + i / Decimal(100))
+                        if options["distinct_prices"] else "10.49",
+                        "stock": i % 7,
+                    }
+                    for i, product_id in enumerate(ids)
+                ]
+                self.report(rows, "update", updates)
+
+    def report(self, rows, kind, payload):
+        with measure() as m:
+            response = self.client.post("/api/products/batch/", payload, format="json")
+        assert response.status_code == 200, response.content[:500]
+        seconds = m.elapsed_ms / 1000
+        self.stdout.write(
+            f"{rows:>7} {kind:>7} {m.queries:>8} {seconds:>8.2f} {rows / seconds:>9.0f}"
+        )
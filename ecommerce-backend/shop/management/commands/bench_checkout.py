@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+
+from shop.benchmarks import scratch_database, measure, summarize
+from shop.models import Category, Product, Cart, CartItem
+
+
+class Command(BaseCommand):
+    help = "Benchmark POST /api/cart/{id}/checkout/ for carts of different sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lines", type=int, nargs="+", default=[1, 50, 500])
+        parser.add_argument("--repeat", type=int, default=10)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.stdout.write(
+                f"{'lines':>6} {'queries':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"
+            )
+            for lines in options["lines"]:
+                queries, stats = self.run_size(lines, options["repeat"])
+                self.stdout.write(
+                    f"{lines:>6} {queries:>8} {stats['p50_ms']:>9} "
+                    f"{stats['p95_ms']:>9} {stats['max_ms']:>9}"
+                )
+
+    def run_size(self, lines, repeat):
+        user = User.objects.create_user(username=f"bench-{lines}", password="x")
+        category = Category.objects.create(name=f"Bench {lines}", slug=f"bench-{lines}")
+        products = Product.objects.bulk_create(
+            Product(
+                category=category,
+                name=f"Bench {lines}/{i}",
+                slug=f"bench-{lines}-{i}",
+                price=Decimal("9.99"),
+                stock=repeat * 10,
+            )
+            for i in range(lines)
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        samples, queries = [], set()
+        for _ in range(repeat):
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.bulk_create(
+                CartItem(cart=cart, product=product, quantity=2) for product in products
+            )
+            with measure() as m:
+                response = client.post(f"/api/cart/{cart.pk}/checkout/")
+            assert response.status_code == 201, response.content
+            samples.append(m.elapsed_ms)
+            queries.add(m.queries)
+        return "/".join(str(q) for q in sorted(queries)), summarize(samples)
@@ -0,0 +1,235 @@
+import json
+import random
+import sys
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from shop.benchmarks import measure, scratch_database, seed_catalog, summarize
+from shop.models import Cart, CartItem
+from shop.reservations import reserve
+
+
+# Per-endpoint limits: p95 latency (ms) and the most SQL queries any one
+# request may run. Latencies are generous so that the check only trips on
+# real regressions on a laptop; query counts are exact and catch N+1s.
+# Override with --thresholds FILE (same shape, partial is fine).
+THRESHOLDS = {
+    "products-list": {"p95_ms": 50, "queries": 3},
+    "products-filter": {"p95_ms": 60, "queries": 3},
+    # The FTS5 rank is a correlated subquery per match, so broad terms are
+    # slow on SQLite; PostgreSQL ranks from the GIN-indexed tsvector.
+    "products-search": {"p95_ms": 1500, "queries": 3},
+    "products-ordering": {"p95_ms": 50, "queries": 3},
+    "products-cursor": {"p95_ms": 40, "queries": 2},
+    "products-facets": {"p95_ms": 80, "queries": 2},
+    "product-detail": {"p95_ms": 30, "queries": 2},
+    "cart": {"p95_ms": 30, "queries": 2},
+    "add-to-cart": {"p95_ms": 50, "queries": 12},
+    "checkout": {"p95_ms": 100, "queries": 18},
+    "my-orders": {"p95_ms": 50, "queries": 3},
+}
+
+# Lines in each cart that is checked out.
+CHECKOUT_LINES = 5
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a reproducible catalog in a scratch database and measure latency "
+        "percentiles and SQL query counts of the main API endpoints. Writes "
+        "the results as JSON and fails if an endpoint exceeds its threshold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--products", type=int, default=5000)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--orders-per-user", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=50, help="Measured requests per endpoint.")
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument(
+            "--endpoints", nargs="+", choices=list(THRESHOLDS), default=list(THRESHOLDS),
+        )
+        parser.add_argument("--output", help="Write the JSON results to this file ('-' for stdout).")
+        parser.add_argument("--baseline", help="JSON results of an earlier run to compare against.")
+        parser.add_argument("--thresholds", help="JSON file overriding the per-endpoint thresholds.")
+        parser.add_argument(
+            "--response-cache",
+            action="store_true",
+            help="Leave the catalog response cache on (by default it is disabled "
+                 "so every request reaches the database).",
+        )
+
+    def handle(self, *args, **options):
+        thresholds = {name: dict(limits) for name, limits in THRESHOLDS.items()}
+        if options["thresholds"]:
+            with open(options["thresholds"]) as f:
+                for name, limits in json.load(f).items():
+                    thresholds.setdefault(name, {}).update(limits)
+        baseline = {}
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)["endpoints"]
+
+        caches = None
+        if not options["response_cache"]:
+            caches = {
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "catalog": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+            }
+        with override_settings(**({"CACHES": caches} if caches else {})):
+            with scratch_database():
+                self.rng = random.Random(options["seed"])
+                self.data = seed_catalog(
+                    categories=options["categories"],
+                    products=options["products"],
+                    users=options["users"],
+                    orders_per_user=options["orders_per_user"],
+                    seed=options["seed"],
+                )
+                self.in_stock = [product for product in self.data.products if product.stock >= 100]
+                self.anonymous = APIClient()
+                self.clients = {}
+                results = {
+                    name: self.run_endpoint(name, options["repeat"], options["warmup"], thresholds.get(name, {}))
+                    for name in options["endpoints"]
+                }
+                vendor = connection.vendor
+
+        # Keep stdout clean for JSON when writing it there.
+        self.report(results, baseline, self.stderr if options["output"] == "-" else self.stdout)
+        output = {
+            "meta": {
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "database": vendor,
+                "response_cache": options["response_cache"],
+                **{key: options[key] for key in ("categories", "products", "users", "orders_per_user", "seed", "repeat")},
+            },
+            "passed": all(result["passed"] for result in results.values()),
+            "endpoints": results,
+        }
+        if options["output"] == "-":
+            json.dump(output, sys.stdout, indent=2)
+            sys.stdout.write("\n")
+        elif options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(output, f, indent=2)
+
+        failed = [name for name, result in results.items() if not result["passed"]]
+        if failed:
+            raise CommandError(f"Over threshold: {', '.join(failed)}")
+
+    # -----------------------
+    # Endpoints
+    # -----------------------
+
+    def client_for(self, user):
+        client = self.clients.get(user.pk)
+        if client is None:
+            client = self.clients[user.pk] = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return client
+
+    def request(self, name, i):
+        """
+        (client, method, path, data, expected status) for the i-th request
+        of an endpoint, after doing any unmeasured setup it needs.
+        """
+        user = self.data.users[i % len(self.data.users)]
+        # Catalog reads are made anonymously, like most shoppers browse.
+        client = self.anonymous if name.startswith("product") else self.client_for(user)
+        products = self.data.products
+        if name == "products-list":
+            return client, "get", f"/api/products/?page={i % 10 + 1}", None, 200
+        if name == "products-filter":
+            category = self.data.categories[i % len(self.data.categories)]
+            return client, "get", f"/api/products/?category={category.slug}&min_price=10&max_price=200&in_stock=true", None, 200
+        if name == "products-search":
+            word = self.rng.choice(["wireless", "lamp", "premium mug", "vintage", "bottle"])
+            return client, "get", f"/api/products/?search={word}", None, 200
+        if name == "products-ordering":
+            ordering = ["price", "-price", "updated", "-created"][i % 4]
+            return client, "get", f"/api/products/?ordering={ordering}&page={i % 5 + 1}", None, 200
+        if name == "products-cursor":
+            return client, "get", "/api/products/?pagination=cursor", None, 200
+        if name == "products-facets":
+            category = self.data.categories[i % len(self.data.categories)]
+            query = ["", f"?category={category.slug}", "?in_stock=true&max_price=100"][i % 3]
+            return client, "get", f"/api/products/facets/{query}", None, 200
+        if name == "product-detail":
+            return client, "get", f"/api/products/{products[i * 7919 % len(products)].slug}/", None, 200
+        if name == "cart":
+            return client, "get", "/api/cart/my-cart/", None, 200
+        if name == "add-to-cart":
+            product = self.rng.choice(self.in_stock)
+            return client, "post", "/api/cart-items/", {"product": product.pk, "quantity": 1}, 201
+        if name == "checkout":
+            cart = self.fill_cart(user)
+            return client, "post", f"/api/cart/{cart.pk}/checkout/", None, 201
+        if name == "my-orders":
+            return client, "get", "/api/orders/my-orders/", None, 200
+        raise CommandError(f"Unknown endpoint {name}")
+
+    def fill_cart(self, user):
+        cart, _ = Cart.objects.get_or_create(user=user, status="active")
+        in_cart = set(cart.items.values_list("product_id", flat=True))
+        for product in self.rng.sample(self.in_stock, CHECKOUT_LINES * 2):
+            if len(in_cart) >= CHECKOUT_LINES:
+                break
+            if product.pk not in in_cart:
+                reserve(CartItem.objects.create(cart=cart, product=product), 1)
+                in_cart.add(product.pk)
+        return cart
+
+    def warm_user_cache(self):
+        # Token users are cached per process for a short TTL; refresh every
+        # entry first so the first request per user doesn't count one
+        # extra lookup.
+        for user in self.data.users:
+            self.client_for(user).get("/api/users/me/")
+
+    def run_endpoint(self, name, repeat, warmup, limits):
+        if not name.startswith("product"):
+            self.warm_user_cache()
+        samples, queries = [], []
+        path = None
+        for i in range(warmup + repeat):
+            client, method, path, data, expected = self.request(name, i)
+            with measure() as m:
+                response = getattr(client, method)(path, data, format="json")
+            if response.status_code != expected:
+                raise CommandError(f"{name}: {method.upper()} {path} returned {response.status_code}: {response.content[:500]!r}")
+            if i >= warmup:
+                samples.append(m.elapsed_ms)
+                queries.append(m.queries)
+
+        result = {
+            "request": f"{method.upper()} {path}",
+            **summarize(samples),
+            "queries": max(queries),
+            "queries_min": min(queries),
+            "thresholds": limits,
+        }
+        result["passed"] = all(result[key] <= limit for key, limit in limits.items())
+        return result
+
+    def report(self, results, baseline, out):
+        out.write(
+            f"{'endpoint':<18} {'queries':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'limit':>7} {'vs base':>8}  result"
+        )
+        for name, result in results.items():
+            change = ""
+            if name in baseline and baseline[name]["p95_ms"]:
+                change = f"{(result['p95_ms'] / baseline[name]['p95_ms'] - 1) * 100:+.0f}%"
+            limit = result["thresholds"].get("p95_ms", "")
+            out.write(
+                f"{name:<18} {result['queries']:>7} {result['p50_ms']:>8} {result['p95_ms']:>8} "
+                f"{result['p99_ms']:>8} {limit:>7} {change:>8}  {'ok' if result['passed'] else 'FAIL'}"
+            )
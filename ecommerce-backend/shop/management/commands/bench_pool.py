@@ -0,0 +1,169 @@
+import http.client
+import os
+import tempfile
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from prometheus_client.parser import text_string_to_metric_families
+
+from shop.benchmarks import database_url, gunicorn_server, run_load, scratch_database, seed_catalog
+
+
+SERVERS = {
+    # name: (application, worker options, URL prefix of the catalog reads)
+    "gthread": ("core.wsgi:application", ["--worker-class", "gthread"], "/api"),
+    "asgi": ("core.asgi:application", ["--worker-class", "uvicorn_worker.UvicornWorker"], "/api/async"),
+}
+
+CONNECTIONS_SQL = """
+    SELECT count(*), count(*) FILTER (WHERE state = 'active')
+    FROM pg_stat_activity
+    WHERE datname = current_database() AND pid <> pg_backend_pid()
+"""
+
+METRICS_TOKEN = "bench-pool"
+
+
+class ConnectionSampler(threading.Thread):
+    """
+    Polls pg_stat_activity for the peak number of open and active
+    connections, and counts what is still open once stopped.
+    """
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.peak_open = self.peak_active = self.open_after = 0
+
+    def sample(self):
+        with connection.cursor() as cursor:
+            cursor.execute(CONNECTIONS_SQL)
+            return cursor.fetchone()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                opened, active = self.sample()
+                self.peak_open = max(self.peak_open, opened)
+                self.peak_active = max(self.peak_active, active)
+            self.open_after = self.sample()[0]
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the catalog reads on PostgreSQL under threaded (gthread) "
+        "or async (uvicorn) workers, once with persistent per-thread "
+        "connections and once with the psycopg connection pool, and report "
+        "latency next to the number of server connections each one holds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--server", choices=sorted(SERVERS), default="gthread")
+        parser.add_argument("--modes", nargs="+", choices=["persistent", "pool"], default=["persistent", "pool"])
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--threads", type=int, default=8, help="Threads per gthread worker.")
+        parser.add_argument("--pool-min-size", type=int, default=2)
+        parser.add_argument("--pool-max-size", type=int, default=4)
+        parser.add_argument("--concurrency", type=int, default=32, help="Client connections.")
+        parser.add_argument("--requests", type=int, default=2000, help="Measured requests per mode.")
+        parser.add_argument("--warmup", type=int, default=100)
+        parser.add_argument("--products", type=int, default=2000)
+        parser.add_argument("--port", type=int, default=8766)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("bench_pool needs DATABASE_URL to point at PostgreSQL.")
+        application, worker_options, prefix = SERVERS[options["server"]]
+        with tempfile.TemporaryDirectory() as tmp, scratch_database():
+            data = seed_catalog(products=options["products"], users=1, orders_per_user=0, cart_items=0)
+            paths = (
+                [f"{prefix}/products/?page={page}" for page in range(1, 11)]
+                + [f"{prefix}/products/?category={category.slug}" for category in data.categories[:5]]
+                + [f"{prefix}/products/{product.slug}/" for product in data.products[::max(1, len(data.products) // 20)]]
+                + [f"{prefix}/categories/"]
+            )
+            env = dict(
+                os.environ,
+                DATABASE_URL=database_url(connection.settings_dict),
+                CATALOG_CACHE_TIMEOUT="0",
+                METRICS_TOKEN=METRICS_TOKEN,
+                DATABASE_POOL_MIN_SIZE=str(options["pool_min_size"]),
+                DATABASE_POOL_MAX_SIZE=str(options["pool_max_size"]),
+            )
+            env.setdefault("SHOP_LOG_LEVEL", "ERROR")
+            # Only the servers' connections should show up in the counts.
+            connection.close()
+            args = ["--workers", str(options["workers"]), *worker_options]
+            if options["server"] == "gthread":
+                args += ["--threads", str(options["threads"])]
+
+            self.stdout.write(
+                f"{options['server']}: {options['workers']} workers"
+                + (f" x {options['threads']} threads" if options["server"] == "gthread" else "")
+                + f", pool {options['pool_min_size']}..{options['pool_max_size']} per worker, "
+                f"{options['concurrency']} client connections, {options['requests']} requests\n"
+            )
+            self.stdout.write(
+                f"{'mode':>10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6} "
+                f"{'peak conns':>10} {'active':>6} {'open after':>10} {'queued':>6} {'avg wait ms':>11}"
+            )
+            for mode in options["modes"]:
+                env["DATABASE_POOL"] = "true" if mode == "pool" else "false"
+                env["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(tmp, mode)
+                os.makedirs(env["PROMETHEUS_MULTIPROC_DIR"])
+                result = self.run_mode(application, args, env, paths, options)
+                self.stdout.write(
+                    f"{mode:>10} {result['rps']:>8.1f} {result['p50_ms']:>8} {result['p95_ms']:>8} "
+                    f"{result['p99_ms']:>8} {result['errors']:>6} {result['peak_open']:>10} "
+                    f"{result['peak_active']:>6} {result['open_after']:>10} "
+                    f"{result.get('queued', '-'):>6} {result.get('avg_wait_ms', '-'):>11}"
+                )
+            connections.close_all()
+
+    def run_mode(self, application, args, env, paths, options):
+        port = options["port"]
+        try:
+            with gunicorn_server(application, port, env, paths[0], *args):
+                run_load(port, paths, options["warmup"], options["concurrency"])
+                sampler = ConnectionSampler()
+                sampler.start()
+                try:
+                    rps, stats, errors = run_load(port, paths, options["requests"], options["concurrency"])
+                finally:
+                    sampler.stop()
+                result = {
+                    "rps": rps, **stats, "errors": errors,
+                    "peak_open": sampler.peak_open,
+                    "peak_active": sampler.peak_active,
+                    # What the workers keep open between bursts.
+                    "open_after": sampler.open_after,
+                }
+                if env["DATABASE_POOL"] == "true":
+                    result.update(self.pool_stats(port))
+                return result
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+    def pool_stats(self, port):
+        # Summed over the workers since they started (warmup included):
+        # requests that found no free connection, and how long they waited.
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        conn.request("GET", "/api/metrics", headers={"Authorization": f"Bearer {METRICS_TOKEN}"})
+        text = conn.getresponse().read().decode()
+        conn.close()
+        queued = wait = 0.0
+        for family in text_string_to_metric_families(text):
+            for sample in family.samples:
+                if sample.name == "shop_db_pool_events_total" and sample.labels.get("event") == "queued":
+                    queued += sample.value
+                elif sample.name == "shop_db_pool_wait_seconds_total":
+                    wait += sample.value
+        return {"queued": int(queued), "avg_wait_ms": round(wait * 1000 / queued, 1) if queued else 0.0}
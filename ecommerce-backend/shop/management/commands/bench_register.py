@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from shop.benchmarks import scratch_database, measure, summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark POST /api/auth/register/ and report registrations per "
+        "second and queries per registration."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=50)
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            nargs="+",
+            default=[0],
+            help="PBKDF2 iteration counts to compare (0 = settings value).",
+        )
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.stdout.write(
+                f"{'iterations':>10} {'reg/s':>8} {'queries':>8} {'p50 ms':>9} {'p95 ms':>9}"
+            )
+            for iterations in options["iterations"]:
+                overrides = {"PASSWORD_HASH_ITERATIONS": iterations} if iterations else {}
+                with override_settings(**overrides):
+                    queries, stats = self.run_batch(iterations, options["count"])
+                per_second = 1000 / stats["mean_ms"] if stats["mean_ms"] else 0
+                self.stdout.write(
+                    f"{iterations or 'default':>10} {per_second:>8.1f} {queries:>8} "
+                    f"{stats['p50_ms']:>9} {stats['p95_ms']:>9}"
+                )
+
+    def run_batch(self, iterations, count):
+        client = APIClient()
+        samples, queries = [], set()
+        for i in range(count):
+            payload = {
+                "username": f"bench-{iterations}-{i}",
+                "email": f"bench-{iterations}-{i}@example.com",
+                "password": "correct horse battery staple",
+                "profile": {"phone": "555-0100", "bio": "bench"},
+            }
+            with measure() as m:
+                response = client.post("/api/auth/register/", payload, format="json")
+            assert response.status_code == 201, response.content
+            samples.append(m.elapsed_ms)
+            queries.add(m.queries)
+        return "/".join(str(q) for q in sorted(queries)), summarize(samples)
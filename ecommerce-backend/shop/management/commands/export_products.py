@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.catalog_io import FORMATS, detect_format, export_lines, export_rows
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = "Stream the product catalog to a CSV or JSON Lines file (or stdout)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-", help="Output file, or '-' for stdout")
+        parser.add_argument("--format", dest="file_format", choices=FORMATS,
+                            help="Defaults to the file extension, then csv")
+        parser.add_argument("--category", help="Only export this category slug")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["file_format"] or detect_format(path)
+        queryset = Product.objects.all()
+        if options["category"]:
+            queryset = queryset.filter(category__slug=options["category"])
+
+        lines = export_lines(export_rows(queryset, options["chunk_size"]), file_format)
+        if path == "-":
+            sys.stdout.writelines(lines)
+            return
+        try:
+            with open(path, "w", newline="", encoding="utf-8") as out:
+                out.writelines(lines)
+        except OSError as e:
+            raise CommandError(str(e))
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.images import generate_pending_variants
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the WebP/JPEG thumbnail, card and full-size variants of product "
+        "images that don't have them yet. Run it from cron, or with --interval "
+        "as a long-lived worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Products loaded per query.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running, checking for new images every N seconds.",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Regenerate the variants of every product image first "
+                 "(e.g. after changing the sizes).",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            Product.objects.exclude(image="").exclude(image__isnull=True).update(image_variants=None)
+        while True:
+            total = 0
+            while True:
+                processed, generated = generate_pending_variants(batch_size=options["batch_size"])
+                total += generated
+                if processed < options["batch_size"]:
+                    break
+            self.stdout.write(f"Generated variants for {total} product images.")
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
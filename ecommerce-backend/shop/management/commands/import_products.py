@@ -0,0 +1,52 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.catalog_io import FORMATS, ProductImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream products from a CSV or JSON Lines file (or '-' for stdin) and "
+        "upsert them by slug in fixed-size chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to read, or '-' for stdin")
+        parser.add_argument("--format", dest="file_format", choices=FORMATS,
+                            help="Defaults to the file extension, then csv")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--create-categories", action="store_true",
+                            help="Create categories for unknown slugs instead of rejecting the row")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Validate and count without writing")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["file_format"] or detect_format(path)
+        if options["chunk_size"] <= 0:
+            raise CommandError("--chunk-size must be positive")
+
+        def report(line_number, message):
+            self.stderr.write(f"line {line_number}: {message}")
+
+        importer = ProductImporter(
+            chunk_size=options["chunk_size"],
+            create_categories=options["create_categories"],
+            dry_run=options["dry_run"],
+            on_error=report,
+        )
+        if path == "-":
+            importer.run(read_rows(sys.stdin, file_format))
+        else:
+            try:
+                with open(path, newline="", encoding="utf-8") as stream:
+                    importer.run(read_rows(stream, file_format))
+            except OSError as e:
+                raise CommandError(str(e))
+
+        prefix = "[dry run] " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{importer.created} created, {importer.updated} updated, "
+            f"{importer.failed} rejected."
+        ))
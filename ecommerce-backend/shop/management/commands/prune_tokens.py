@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop.tokens import prune_outstanding_tokens
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired outstanding JWT refresh tokens and their blacklist "
+        "entries in chunks. Run it from cron, or with --interval as a "
+        "long-lived worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=settings.TOKEN_PRUNE_CHUNK_SIZE,
+            help="Tokens deleted per transaction.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.05,
+            help="Seconds to sleep between chunks.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running, pruning every N seconds.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = prune_outstanding_tokens(
+                chunk_size=options["chunk_size"], pause=options["pause"]
+            )
+            self.stdout.write(f"Deleted {deleted} expired outstanding tokens.")
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
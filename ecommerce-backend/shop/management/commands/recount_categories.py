@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from shop.cache import bump_catalog_version
+from shop.counters import recount_categories
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Category.product_count / in_stock_count from the product "
+        "table. Only needed after writes that bypass the ORM signals."
+    )
+
+    def handle(self, *args, **options):
+        updated = recount_categories()
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"Recounted {updated} categories."))
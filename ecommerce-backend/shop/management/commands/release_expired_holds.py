@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop.reservations import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = (
+        "Release cart stock reservations whose TTL has passed. Run it from "
+        "cron, or with --interval as a long-lived worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.STOCK_RESERVATION_SWEEP_BATCH,
+            help="Holds released per transaction.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running, sweeping every N seconds.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired_holds(batch_size=options["batch_size"])
+            self.stdout.write(f"Released {released} expired holds.")
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
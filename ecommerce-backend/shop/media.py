@@ -0,0 +1,153 @@
+"""
+Serving uploaded media (MEDIA_ROOT).
+
+Files go out through FileResponse, which WSGI servers with a file wrapper
+(gunicorn) send with sendfile(), so the bytes never pass through Python.
+Single byte ranges are answered with 206 by handing the server a bounded
+view of the file at the right offset. Behind nginx, set
+MEDIA_ACCEL_REDIRECT_PREFIX to an `internal` location aliased to
+MEDIA_ROOT: the view then only checks the file and its validators and
+nginx sends it, ranges included.
+
+Content-hashed names (the image variants written by images.py) never
+change content, so they are cached as immutable for a year; everything
+else for MEDIA_MAX_AGE and revalidated with ETag / Last-Modified.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+
+# A file name that is a hex digest, e.g. products/variants/3f2a9c0e1b7d4a65.webp
+HASHED_NAME = re.compile(r"(?:^|/)[0-9a-f]{16,64}\.[A-Za-z0-9]+$")
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class UnsatisfiableRange(Exception):
+    pass
+
+
+class FileRange:
+    """
+    `length` bytes of an open file from its current position. Exposes
+    fileno() so the WSGI file wrapper can sendfile() the range (gunicorn
+    sends Content-Length bytes from the current offset).
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    (first, last) byte positions for a single-range Range header, or None
+    to send the whole file (malformed or multi-range headers may be ignored
+    per RFC 9110). Raises UnsatisfiableRange if the range is out of bounds.
+    """
+    match = BYTE_RANGE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes.
+        if int(last) == 0 or size == 0:
+            raise UnsatisfiableRange
+        return max(0, size - int(last)), size - 1
+    first = int(first)
+    if last and int(last) < first:
+        return None
+    if first >= size:
+        raise UnsatisfiableRange
+    return first, min(int(last), size - 1) if last else size - 1
+
+
+def if_range_matches(request, etag, last_modified):
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        # Strong comparison: weak tags never match.
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def add_media_headers(response, path, etag, last_modified):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Accept-Ranges"] = "bytes"
+    if HASHED_NAME.search(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_MAX_AGE)
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        st = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404("File not found.")
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404("File not found.")
+
+    # Same shape as nginx's: changes whenever the file is replaced.
+    etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    last_modified = int(st.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return add_media_headers(response, path, etag, last_modified)
+
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        response = HttpResponse(
+            content_type=mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        )
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + quote(path)
+        return add_media_headers(response, path, etag, last_modified)
+
+    byte_range = None
+    if "HTTP_RANGE" in request.META and if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.META["HTTP_RANGE"], st.st_size)
+        except UnsatisfiableRange:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{st.st_size}"
+            return add_media_headers(response, path, etag, last_modified)
+
+    file = open(full_path, "rb")
+    if byte_range is None:
+        response = FileResponse(file)
+    else:
+        first, last = byte_range
+        file.seek(first)
+        response = FileResponse(FileRange(file, last - first + 1), status=206)
+        response["Content-Length"] = last - first + 1
+        response["Content-Range"] = f"bytes {first}-{last}/{st.st_size}"
+    return add_media_headers(response, path, etag, last_modified)
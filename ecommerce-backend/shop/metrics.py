@@ -0,0 +1,211 @@
+"""
+Application metrics in Prometheus text format, served at /api/metrics.
+
+Requests are recorded by the instrumentation middleware (latency, response
+size and SQL query count, labelled by route: the DRF router basename such
+as `product` or `cart-items`, else the URL name). Cache lookups and checkout
+outcomes are counted where they happen. Hit ratios are left to the
+scraper: rate(shop_cache_requests_total{result="hit"}) over the sum.
+
+Under gunicorn each worker is its own process. gunicorn.conf.py points
+PROMETHEUS_MULTIPROC_DIR at a local directory, prometheus_client then
+keeps every worker's values in memory-mapped files there, and a scrape
+of any worker merges them all. Without it (runserver, tests) the values
+are simply per process.
+
+With DATABASE_POOL on, every process also reports its connection pools
+(shop_db_pool_*). Gauges are summed over live workers; counters grow by
+the change in the pool's own counters since the last report, at most
+once a second per process from the request path, and on every scrape.
+
+The endpoint is for staff sessions or a scraper presenting METRICS_TOKEN
+as a bearer token.
+"""
+import hmac
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+
+request_latency = Histogram(
+    "shop_http_request_duration_seconds",
+    "Time to serve a request, by route.",
+    ["route", "method"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+requests_total = Counter(
+    "shop_http_requests",
+    "Requests served, by route and status code.",
+    ["route", "method", "status"],
+)
+response_size = Histogram(
+    "shop_http_response_size_bytes",
+    "Response body size, by route.",
+    ["route"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+db_queries = Histogram(
+    "shop_db_queries_per_request",
+    "SQL queries run while serving a request, by route.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+cache_requests = Counter(
+    "shop_cache_requests",
+    "Cache lookups by cache and result (hit / miss).",
+    ["cache", "result"],
+)
+checkouts = Counter(
+    "shop_checkouts",
+    "Checkout attempts by outcome.",
+    ["outcome"],
+)
+pool_connections = Gauge(
+    "shop_db_pool_connections",
+    "Open pooled database connections, by state (in_use / idle).",
+    ["database", "state"],
+    multiprocess_mode="livesum",
+)
+pool_max_connections = Gauge(
+    "shop_db_pool_max_connections",
+    "Connections the pools may open.",
+    ["database"],
+    multiprocess_mode="livesum",
+)
+pool_waiting = Gauge(
+    "shop_db_pool_requests_waiting",
+    "Requests currently waiting for a pooled connection.",
+    ["database"],
+    multiprocess_mode="livesum",
+)
+pool_events = Counter(
+    "shop_db_pool_events",
+    "Pool events: connection requests, requests that had to queue, requests "
+    "that timed out or failed, connections opened, failed to open, or lost.",
+    ["database", "event"],
+)
+pool_wait = Counter(
+    "shop_db_pool_wait_seconds",
+    "Time requests spent queued for a pooled connection.",
+    ["database"],
+)
+
+
+def route_name(resolver_match):
+    if resolver_match is None:
+        return "unmatched"
+    # Router-generated views carry their basename in initkwargs.
+    initkwargs = getattr(resolver_match.func, "initkwargs", None) or {}
+    return initkwargs.get("basename") or resolver_match.url_name or "-"
+
+
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+def record_request(method, route, status, duration, size, queries):
+    # Clients choose the method; don't let them grow the label set.
+    method = method if method in METHODS else "other"
+    request_latency.labels(route, method).observe(duration)
+    requests_total.labels(route, method, str(status)).inc()
+    if size is not None:
+        response_size.labels(route).observe(size)
+    db_queries.labels(route).observe(queries)
+    record_pool_stats()
+
+
+def record_cache(cache, hit):
+    cache_requests.labels(cache, "hit" if hit else "miss").inc()
+
+
+def record_checkout(outcome):
+    checkouts.labels(outcome).inc()
+
+
+# psycopg_pool counter -> event label
+POOL_EVENTS = {
+    "requests_num": "requests",
+    "requests_queued": "queued",
+    "requests_errors": "errors",
+    "connections_num": "connections_opened",
+    "connections_errors": "connection_errors",
+    "connections_lost": "connections_lost",
+}
+POOL_STATS_INTERVAL = 1.0
+
+_pool_lock = threading.Lock()
+_pool_last = {}
+_pool_reported = 0.0
+
+
+def pool_stats():
+    """psycopg_pool statistics of this process's pools, by database alias."""
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], "pool", None)
+        if pool is not None:
+            stats[alias] = pool.get_stats()
+    return stats
+
+
+def record_pool_stats(force=False):
+    global _pool_reported
+    if not settings.DATABASE_POOL:
+        return
+    with _pool_lock:
+        now = time.monotonic()
+        if not force and now - _pool_reported < POOL_STATS_INTERVAL:
+            return
+        _pool_reported = now
+        for alias, stats in pool_stats().items():
+            size, available = stats.get("pool_size", 0), stats.get("pool_available", 0)
+            pool_connections.labels(alias, "in_use").set(size - available)
+            pool_connections.labels(alias, "idle").set(available)
+            pool_max_connections.labels(alias).set(stats.get("pool_max", 0))
+            pool_waiting.labels(alias).set(stats.get("requests_waiting", 0))
+            # The pool's counters only grow; report what they grew by.
+            last = _pool_last.get(alias, {})
+            for key, event in POOL_EVENTS.items():
+                delta = stats.get(key, 0) - last.get(key, 0)
+                if delta > 0:
+                    pool_events.labels(alias, event).inc(delta)
+            delta = stats.get("requests_wait_ms", 0) - last.get("requests_wait_ms", 0)
+            if delta > 0:
+                pool_wait.labels(alias).inc(delta / 1000)
+            _pool_last[alias] = stats
+
+
+def collect():
+    record_pool_stats(force=True)
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def allowed(request):
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    header = request.headers.get("Authorization", "")
+    return bool(token) and hmac.compare_digest(header.encode(), f"Bearer {token}".encode())
+
+
+def metrics_view(request):
+    if not allowed(request):
+        return HttpResponseForbidden("Forbidden")
+    return HttpResponse(collect(), content_type=CONTENT_TYPE_LATEST)
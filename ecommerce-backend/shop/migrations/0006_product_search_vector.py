@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:04
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# PostgreSQL only: keep search_vector in sync with a BEFORE trigger (so
+# bulk_create / queryset updates are covered too) and index it with GIN.
+# SQLite uses an FTS5 shadow table installed by shop.search instead.
+POSTGRES_FORWARD_SQL = [
+    """
+    CREATE OR REPLACE FUNCTION shop_product_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER shop_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description ON shop_product
+    FOR EACH ROW EXECUTE FUNCTION shop_product_search_vector_update()
+    """,
+    # Backfill existing rows through the trigger.
+    "UPDATE shop_product SET name = name",
+    "CREATE INDEX shop_product_search_vector_gin ON shop_product USING gin (search_vector)",
+]
+
+POSTGRES_REVERSE_SQL = [
+    "DROP INDEX IF EXISTS shop_product_search_vector_gin",
+    "DROP TRIGGER IF EXISTS shop_product_search_vector_trigger ON shop_product",
+    "DROP FUNCTION IF EXISTS shop_product_search_vector_update()",
+]
+
+
+def install_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for sql in POSTGRES_FORWARD_SQL:
+        schema_editor.execute(sql)
+
+
+def remove_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for sql in POSTGRES_REVERSE_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(install_search_trigger, remove_search_trigger),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_product_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='shop_order_user_id_f8b1c9_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='shop_produc_id_c70a51_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='shop_produc_slug_76971b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='shop_produc_created_ef211c_idx',
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['user'], name='cart_active_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='shop_order_user_id_309a45_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', '-created', '-id'], name='shop_produc_categor_6d1074_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'price', 'id'], name='shop_produc_categor_634bc6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__gt', models.F('reserved'))), fields=['-created', '-id'], name='product_in_stock_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock__gt', models.F('reserved'))), fields=['updated', 'id'], name='product_in_stock_updated_idx'),
+        ),
+    ]
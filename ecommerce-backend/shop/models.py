@@ -1,4 +1,8 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import F, Q, Sum
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import User
 from django.utils import timezone
 
@@ -6,6 +10,12 @@ from django.utils import timezone
 class Category(models.Model):
     name = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True)
+    # Denormalized counters, maintained incrementally from product writes
+    # (see shop/signals.py and shop/counters.py).
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    in_stock_count = models.PositiveIntegerField(default=0, editable=False)
+    # Also set by the counter UPDATEs; category ETags are derived from it.
+    updated = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['name']
@@ -29,23 +39,60 @@ class Product(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
+    # Units held by active cart reservations (sum of StockHold.quantity),
+    # kept in step by shop/reservations.py so reads never scan the holds.
+    reserved = models.PositiveIntegerField(default=0, editable=False)
     available = models.BooleanField(default=True)
     image = models.ImageField(upload_to='products/%Y/%m/%d', blank=True, null=True)
+    # Resized copies of `image`, written by shop/images.py outside the
+    # request; NULL while pending. See images.render_variants for the shape.
+    image_variants = models.JSONField(null=True, blank=True, editable=False)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    # Maintained by a database trigger (GIN-indexed) on PostgreSQL, see
+    # migration 0006. Unused on SQLite, which indexes via FTS5 instead.
+    search_vector = SearchVectorField(null=True, editable=False)
     
+    @property
+    def available_stock(self):
+        return max(self.stock - self.reserved, 0)
+
     @property
     def in_stock(self):
-        return self.stock > 0 and self.available
+        return self.available_stock > 0 and self.available
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this row contributed to its category's counters so
+        # post_save can apply just the difference.
+        if {"category_id", "stock", "reserved", "available"} <= instance.__dict__.keys():
+            instance._counted_state = (instance.category_id, instance.in_stock)
+        return instance
 
 
     
     class Meta:
         ordering = ['-created']
         indexes = [
-            models.Index(fields=['id', 'name']),
-            models.Index(fields=['slug']),
-            models.Index(fields=['-created'])
+            # keyset pagination: (ordering field, id) for each ordering option
+            models.Index(fields=['-created', '-id']),
+            models.Index(fields=['price', 'id']),
+            models.Index(fields=['updated', 'id']),
+            # ?category=: newest first, and by price / price range
+            models.Index(fields=['category', '-created', '-id']),
+            models.Index(fields=['category', 'price', 'id']),
+            # ?in_stock=true; the condition must match ProductFilter's exactly
+            models.Index(
+                fields=['-created', '-id'],
+                condition=Q(stock__gt=F('reserved')),
+                name='product_in_stock_created_idx',
+            ),
+            models.Index(
+                fields=['updated', 'id'],
+                condition=Q(stock__gt=F('reserved')),
+                name='product_in_stock_updated_idx',
+            ),
         ]
         
     
@@ -65,6 +112,14 @@ class Profile(models.Model):
         return f"{self.user.username}'s Profile"
     
     
+class CartQuerySet(models.QuerySet):
+    def with_items(self):
+        """Prefetch items and their products in one extra query."""
+        return self.prefetch_related(
+            models.Prefetch("items", queryset=CartItem.objects.select_related("product"))
+        )
+
+
 class Cart(models.Model):
     STATUS_CHOICES = (
         ("active", "Active"),
@@ -72,21 +127,51 @@ class Cart(models.Model):
         ("abandoned", "Abandoned"),
     )
 
-    user = models.OneToOneField(  # 🔑 ensure 1 active cart per user
+    # A user keeps their checked-out carts, so this is a FK (matching
+    # migration 0003); "one active cart" is enforced by get_or_create on
+    # status="active".
+    user = models.ForeignKey(
         User, 
         on_delete=models.CASCADE, 
-        related_name="cart"
+        related_name="carts"
     )
     
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="active")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # the active cart lookup: WHERE user_id = ? AND status = 'active'
+            models.Index(
+                fields=['user'],
+                condition=Q(status='active'),
+                name='cart_active_user_idx',
+            ),
+        ]
+
+    def _items_prefetched(self):
+        return "items" in getattr(self, "_prefetched_objects_cache", {})
+
     def total_price(self):
-        return sum(item.subtotal() for item in self.items.all())
+        # Use prefetched items (see Cart.objects.with_items()) when present,
+        # otherwise let the database do the sum in one query.
+        if self._items_prefetched():
+            return sum((item.subtotal() for item in self.items.all()), Decimal("0.00"))
+        total = self.items.aggregate(
+            total=Sum(
+                F("quantity") * F("product__price"),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            )
+        )["total"]
+        return total or Decimal("0.00")
     
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        if self._items_prefetched():
+            return sum(item.quantity for item in self.items.all())
+        return self.items.aggregate(total=Sum("quantity"))["total"] or 0
 
     def __str__(self):
         return f"Cart {self.id} - {self.user.username} ({self.status})"
@@ -108,6 +193,24 @@ class CartItem(models.Model):
 
 
 
+class StockHold(models.Model):
+    """
+    Units of a product reserved for a cart item until `expires_at`.
+    Expired holds keep counting towards Product.reserved until the sweeper
+    (`manage.py release_expired_holds`) releases them. If the cart item is
+    deleted without releasing, the hold is orphaned and expires normally.
+    """
+    cart_item = models.OneToOneField(
+        CartItem, on_delete=models.SET_NULL, null=True, blank=True, related_name="hold"
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="holds")
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} until {self.expires_at:%Y-%m-%d %H:%M}"
+
+
 class Order(models.Model):
     STATUS_CHOICES = (
         ("pending", "Pending"),
@@ -120,11 +223,19 @@ class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="orders")
     cart = models.OneToOneField(Cart, on_delete=models.SET_NULL, null=True, blank=True)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # total units across items, stored at checkout like `total`
+    item_count = models.PositiveIntegerField(default=0)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     checkout_date = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # order history: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+            models.Index(fields=['user', '-created_at', '-id']),
+        ]
+
     def __str__(self):
         return f"Order {self.id} - {self.user.username}"
 
@@ -132,6 +243,11 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    # unit price at checkout time, so later price changes don't alter orders
+    price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    def subtotal(self):
+        return self.price * self.quantity
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
@@ -0,0 +1,209 @@
+import json
+from base64 import b64decode, b64encode
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import PageNumberPagination, BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination.
+
+    Pages are addressed by the sort key of the last row seen instead of an
+    OFFSET, and no COUNT(*) is issued, so every page costs the same index
+    range scan no matter how deep the client goes. The sort key is the
+    view's ordering (from OrderingFilter) with the primary key appended as a
+    tie-breaker, e.g. (-created, -id) or (price, id).
+    """
+
+    cursor_query_param = "cursor"
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    default_ordering = ("-created",)
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [self._flip(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self._seek_filter(ordering, position))
+            except (TypeError, ValueError, ValidationError):
+                # Tampered values that don't convert to the column's type.
+                raise NotFound(self.invalid_cursor_message)
+
+        # Fetch one extra row to find out whether there is a following page.
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Reuse the view's OrderingFilter so `?ordering=` means the same thing
+        in both pagination modes, then make the key unique with the pk.
+        """
+        ordering = None
+        backends = getattr(view, "filter_backends", [])
+        ordering_filter = next(
+            (backend for backend in backends if issubclass(backend, OrderingFilter)), None
+        )
+        if ordering_filter is not None:
+            ordering = ordering_filter().get_ordering(request, queryset, view)
+        # Computed annotations (e.g. search relevance) don't round-trip
+        # through a cursor reliably, so the key only uses real columns.
+        ordering = [
+            field for field in (ordering or self.default_ordering)
+            if field.lstrip("-") not in ("id", "pk", *queryset.query.annotations)
+        ] or list(self.default_ordering)
+        tie_breaker = "-id" if ordering and ordering[-1].startswith("-") else "id"
+        return list(ordering) + [tie_breaker]
+
+    # -----------------------
+    # Cursor encoding
+    # -----------------------
+
+    def encode_cursor(self, row, reverse):
+        values = [str(getattr(row, field.lstrip("-"))) for field in self.ordering]
+        payload = {"o": self.ordering, "p": values}
+        if reverse:
+            payload["r"] = 1
+        encoded = b64encode(json.dumps(payload).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(b64decode(encoded.encode(), validate=True))
+            ordering, values = payload["o"], payload["p"]
+            reverse = bool(payload.get("r"))
+            # A cursor is only meaningful for the ordering it was issued under.
+            if ordering != self.ordering or not isinstance(values, list) or len(values) != len(ordering):
+                raise ValueError
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    # -----------------------
+    # Seek predicate
+    # -----------------------
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def _seek_filter(ordering, position):
+        """
+        Build the row-value comparison `(a, b, id) > (x, y, z)` as
+        `a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z)`,
+        honouring the direction of each field.
+        """
+        clauses = []
+        for i, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {f.lstrip("-"): v for f, v in zip(ordering[:i], position[:i])}
+            clauses.append(Q(**equal, **{f"{name}__{lookup}": position[i]}))
+        return reduce(lambda a, b: a | b, clauses)
+
+
+class ProductPagination(StandardResultsSetPagination):
+    """
+    Page-number pagination by default; clients opt in to keyset pagination
+    with `?pagination=cursor` (follow-up links carry `?cursor=`).
+    """
+
+    mode_query_param = "pagination"
+    cursor_class = KeysetPagination
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or self.cursor_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,159 @@
+"""
+Time-limited stock reservations for cart items.
+
+Product.reserved is the running total of all holds, so "how many units are
+free" is `stock - reserved` on the product row itself. Claiming units is a
+conditional `UPDATE ... SET reserved = reserved + n WHERE stock >= reserved + n`,
+which is what keeps concurrent add-to-carts from overselling.
+
+Every change to `reserved` also touches `updated`, since available_stock is
+part of the product representation and its ETag is derived from `updated`.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, PositiveIntegerField, Value
+from django.db.models.functions import Greatest, Now
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .counters import apply_category_deltas, count_state, state_deltas
+from .models import Product, StockHold
+from .services import grouped_case
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product):
+        super().__init__(f"Insufficient stock for {product.slug}")
+        self.product = product
+        self.available = product.available_stock if product.available else 0
+
+
+def _record_changes(changes):
+    """
+    Apply category counter deltas for [(before, after), ...] product states
+    and invalidate cached catalog reads if any product's in_stock flipped.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for before, after in changes:
+        if before == after:
+            continue
+        for category_id, (total, in_stock) in state_deltas(before, after).items():
+            deltas[category_id][0] += total
+            deltas[category_id][1] += in_stock
+    if any(any(delta) for delta in deltas.values()):
+        apply_category_deltas(deltas)
+        transaction.on_commit(bump_catalog_version)
+
+
+def release_holds(holds):
+    """
+    Release [(hold_id, product_id, quantity), ...] and delete the holds.
+    Must run inside a transaction.
+    """
+    if not holds:
+        return
+    amounts = defaultdict(int)
+    for _, product_id, quantity in holds:
+        amounts[product_id] += quantity
+
+    products = list(
+        Product.objects.select_for_update().filter(id__in=amounts).order_by("id")
+    )
+    Product.objects.filter(id__in=amounts).update(
+        reserved=Greatest(
+            F("reserved") - grouped_case(amounts, PositiveIntegerField()),
+            Value(0),
+            output_field=PositiveIntegerField(),
+        ),
+        updated=Now(),
+    )
+    StockHold.objects.filter(id__in=[hold_id for hold_id, _, _ in holds]).delete()
+
+    changes = []
+    for product in products:
+        before = count_state(product)
+        product.reserved = max(product.reserved - amounts[product.id], 0)
+        changes.append((before, count_state(product)))
+    _record_changes(changes)
+
+
+def reserve(cart_item, quantity, ttl=None):
+    """
+    Hold `quantity` units of the item's product for it, replacing whatever
+    it held before and restarting the TTL. Only the difference is claimed
+    or given back. Raises InsufficientStock, changing nothing, when the
+    extra units aren't free. `quantity=0` releases the hold.
+    """
+    ttl = ttl or settings.STOCK_RESERVATION_TTL
+    with transaction.atomic():
+        hold = StockHold.objects.select_for_update().filter(cart_item=cart_item).first()
+        if hold is not None and hold.product_id != cart_item.product_id:
+            # The item was switched to another product.
+            release_holds([(hold.id, hold.product_id, hold.quantity)])
+            hold = None
+
+        delta = quantity - (hold.quantity if hold else 0)
+        product = Product.objects.select_for_update().get(pk=cart_item.product_id)
+        before = count_state(product)
+
+        if delta > 0:
+            claimed = Product.objects.filter(
+                pk=product.pk, available=True, stock__gte=F("reserved") + delta
+            ).update(reserved=F("reserved") + delta, updated=Now())
+            if not claimed:
+                product.refresh_from_db(fields=["stock", "reserved", "available"])
+                raise InsufficientStock(product)
+        elif delta < 0:
+            Product.objects.filter(pk=product.pk).update(
+                reserved=Greatest(F("reserved") + delta, Value(0), output_field=PositiveIntegerField()),
+                updated=Now(),
+            )
+        product.reserved = max(product.reserved + delta, 0)
+
+        if quantity == 0:
+            if hold is not None:
+                hold.delete()
+        elif hold is not None:
+            hold.quantity = quantity
+            hold.expires_at = timezone.now() + ttl
+            hold.save(update_fields=["quantity", "expires_at"])
+        else:
+            hold = StockHold.objects.create(
+                cart_item=cart_item,
+                product_id=product.pk,
+                quantity=quantity,
+                expires_at=timezone.now() + ttl,
+            )
+
+        _record_changes([(before, count_state(product))])
+    return hold
+
+
+def release(cart_item):
+    reserve(cart_item, 0)
+
+
+def release_expired_holds(batch_size=None, now=None):
+    """
+    Release holds whose TTL has passed, `batch_size` at a time, each batch
+    in its own short transaction. Rows locked by a concurrent sweeper are
+    skipped (PostgreSQL), so several sweepers can run side by side.
+    Returns the number of holds released.
+    """
+    batch_size = batch_size or settings.STOCK_RESERVATION_SWEEP_BATCH
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            holds = list(
+                StockHold.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now)
+                .order_by("expires_at")
+                .values_list("id", "product_id", "quantity")[:batch_size]
+            )
+            release_holds(holds)
+        released += len(holds)
+        if len(holds) < batch_size:
+            return released
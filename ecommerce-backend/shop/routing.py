@@ -0,0 +1,102 @@
+"""
+Read-replica routing.
+
+With DATABASE_REPLICA_URLS set, settings.py adds one alias per replica
+(`replica_1`, `replica_2`, ...) and installs ReplicaRouter. Everything
+still goes to `default` unless a view opts in with ReplicaReadMixin: its
+safe requests for the actions listed in `replica_actions` read from a
+replica picked at random per request.
+
+A request stays on the primary for the rest of its life once it asks for
+a write connection (saves, deletes, select_for_update, get_or_create),
+and reads inside a transaction it opened on the primary stay there too,
+so a request never reads around its own writes.
+
+Replicas lag the primary. Catalog reads tolerate that; so does order
+history, where an order placed a moment ago may show up a little later.
+Cart and checkout never opt in.
+
+Locally, two SQLite files stand in for a primary and a replica:
+
+    DATABASE_URL=sqlite:///db.sqlite3 DATABASE_REPLICA_URLS=sqlite:///replica.sqlite3
+    python manage.py migrate && python manage.py migrate --database replica_1
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+_state = ContextVar("shop_replica_routing", default=None)
+
+
+class ReplicaReads:
+    """Routing state of one request: the replica to read from, until a write."""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.wrote = False
+        # Transactions already open (ATOMIC_REQUESTS, tests) don't count.
+        self.atomic_depth = len(connections[DEFAULT_DB_ALIAS].atomic_blocks)
+
+    def on_primary(self):
+        return self.wrote or len(connections[DEFAULT_DB_ALIAS].atomic_blocks) > self.atomic_depth
+
+
+@contextmanager
+def use_replica(alias=None):
+    """
+    Route reads in this block to `alias` (default: a random replica). A
+    no-op without configured replicas.
+    """
+    replicas = settings.DATABASE_REPLICAS
+    if alias is None and not replicas:
+        yield None
+        return
+    state = ReplicaReads(alias or random.choice(replicas))
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.on_primary():
+            return None
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Serve safe requests for `replica_actions` from a read replica. The
+    action is known from the router's method map before dispatch, so
+    authentication and permission checks read from the replica as well.
+    """
+
+    replica_actions = ("list", "retrieve")
+
+    def dispatch(self, request, *args, **kwargs):
+        action = getattr(self, "action_map", {}).get(request.method.lower())
+        if request.method not in SAFE_METHODS or action not in self.replica_actions:
+            return super().dispatch(request, *args, **kwargs)
+        with use_replica():
+            return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,150 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.models import F, FloatField
+from django.db.models.expressions import RawSQL
+from django.db.utils import OperationalError
+from rest_framework import filters as drf_filters
+
+
+FTS_TABLE = "shop_product_fts"
+SEARCH_CONFIG = "english"
+
+# SQLite keeps the index in an external-content FTS5 table fed by triggers.
+# These are (re)installed after every migrate rather than in a migration,
+# because SQLite rebuilds shop_product on most ALTERs and drops its triggers.
+SQLITE_FTS_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        name, description,
+        content='shop_product', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_TRIGGER_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON shop_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON shop_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description ON shop_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+
+def install_sqlite_fts(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    post_migrate hook: create the FTS5 shadow table and its sync triggers.
+    Silently skipped when SQLite was built without FTS5; search then falls
+    back to the plain icontains SearchFilter.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+        if "shop_product" not in tables:
+            return
+        try:
+            if FTS_TABLE not in tables:
+                for sql in SQLITE_FTS_SQL:
+                    cursor.execute(sql)
+            for sql in SQLITE_TRIGGER_SQL:
+                cursor.execute(sql)
+        except OperationalError:
+            # "no such module: fts5"
+            connection.shop_fts_available = False
+            return
+    connection.shop_fts_available = True
+
+
+def fts_available(connection):
+    if connection.vendor == "postgresql":
+        return True
+    if connection.vendor != "sqlite":
+        return False
+    if not hasattr(connection, "shop_fts_available"):
+        with connection.cursor() as cursor:
+            connection.shop_fts_available = (
+                FTS_TABLE in connection.introspection.table_names(cursor)
+            )
+    return connection.shop_fts_available
+
+
+def fts5_match_expression(terms):
+    # Quote every term so user input can't inject FTS5 syntax; the trailing
+    # * keeps the prefix matching people are used to from icontains.
+    return " ".join('"%s"*' % term.replace('"', '""') for term in terms)
+
+
+class ProductSearchFilter(drf_filters.SearchFilter):
+    """
+    `?search=` backed by the database's full-text index.
+
+    Matches are annotated with `search_rank` (higher is more relevant); the
+    ordering filter sorts by it when the client didn't ask for an explicit
+    ordering. Backends without a full-text index fall back to the stock
+    icontains search over `search_fields`.
+    """
+
+    rank_annotation = "search_rank"
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        connection = connections[queryset.db]
+        if not fts_available(connection):
+            return super().filter_queryset(request, queryset, view)
+
+        if connection.vendor == "postgresql":
+            query = SearchQuery(" ".join(terms), config=SEARCH_CONFIG)
+            return queryset.filter(search_vector=query).annotate(
+                **{self.rank_annotation: SearchRank(F("search_vector"), query)}
+            )
+
+        match = fts5_match_expression(terms)
+        product_table = queryset.model._meta.db_table
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+            )
+        ).annotate(**{
+            # bm25() is lower-is-better; negate it to match ts_rank.
+            self.rank_annotation: RawSQL(
+                f"SELECT -rank FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND rowid = {product_table}.id",
+                [match],
+                output_field=FloatField(),
+            )
+        })
+
+
+class ProductOrderingFilter(drf_filters.OrderingFilter):
+    """
+    OrderingFilter that sorts full-text matches by relevance unless the
+    client passed `?ordering=`.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param)
+        rank = ProductSearchFilter.rank_annotation
+        if not params and rank in queryset.query.annotations:
+            return [f"-{rank}", *(self.get_default_ordering(view) or [])]
+        return super().get_ordering(request, queryset, view)
@@ -1,19 +1,28 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
 from django.utils.text import slugify
 from rest_framework import serializers
-from .models import Category, Product, Profile, Cart, CartItem, Order
+from .models import Category, Product, Profile, Cart, CartItem, Order, OrderItem
 from django.contrib.auth.models import User
+from .cache import bump_catalog_version
+from .counters import apply_category_deltas, count_state, state_deltas
+from .images import variant_urls
+from .instrumentation import TimedSerializerMixin
+from .services import bulk_update_grouped, create_user
 
 
 
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     slug = serializers.SlugField(required=False)
 
     class Meta:
         model = Category
-        fields = ["id", "name", "slug"]
-        read_only_fields = ["id"]
+        fields = ["id", "name", "slug", "product_count", "in_stock_count"]
+        read_only_fields = ["id", "product_count", "in_stock_count"]
         
     def validate_name(self, value):
         if Category.objects.filter(name__iexact=value).exists():
@@ -26,15 +35,39 @@ class CategorySerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class CategoryPrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """
+    Category pk field that resolves from a preloaded `{id: Category}` map in
+    the serializer context when one is given (batch writes), instead of one
+    query per row.
+    """
+
+    def to_internal_value(self, data):
+        categories = self.context.get("categories")
+        if categories is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return categories[int(data)]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+
+class ProductSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     # Only keep writable fields
-    category = serializers.PrimaryKeyRelatedField(
+    category = CategoryPrimaryKeyField(
         queryset=Category.objects.all()
     )
     
     slug = serializers.SlugField(required=False)
     price = serializers.DecimalField(max_digits=10, decimal_places=2)
     in_stock = serializers.ReadOnlyField() 
+    available_stock = serializers.ReadOnlyField()
+    # Resized WebP/JPEG URLs; null until generate_image_variants has run.
+    images = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
@@ -45,18 +78,145 @@ class ProductSerializer(serializers.ModelSerializer):
             "price",
             "category",
             "stock",
-            "in_stock"
+            "available_stock",
+            "in_stock",
+            "images",
         ]
 
-    def create(self, validated_data):
-        if not validated_data.get("slug"):
+    def get_images(self, obj):
+        return variant_urls(obj)
+
+    @staticmethod
+    def fill_slug(validated_data, instance=None):
+        if instance is None:
+            if not validated_data.get("slug"):
+                validated_data["slug"] = slugify(validated_data["name"])
+        elif "slug" not in validated_data and validated_data.get("name"):
             validated_data["slug"] = slugify(validated_data["name"])
-        return super().create(validated_data)
+        return validated_data
+
+    def create(self, validated_data):
+        return super().create(self.fill_slug(validated_data))
 
     def update(self, instance, validated_data):
-        if "slug" not in validated_data and validated_data.get("name"):
-            validated_data["slug"] = slugify(validated_data["name"])
-        return super().update(instance, validated_data)
+        return super().update(instance, self.fill_slug(validated_data, instance))
+
+
+class ProductBatchSerializer(serializers.ListSerializer):
+    """
+    List form of ProductSerializer for batch create/update.
+
+    Each row is matched to an existing product by `id`, or else by `slug`;
+    matches are validated as partial updates and everything else as a
+    create. Existing products and referenced categories are loaded with one
+    query each up front, and save() applies the whole batch with
+    bulk_create / bulk_update inside one transaction.
+    """
+
+    child = ProductSerializer()
+    write_batch_size = 1000
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("max_length", 10000)
+        kwargs.setdefault("allow_empty", False)
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self._matches = iter(self.match_rows(data))
+        return super().to_internal_value(data)
+
+    def match_rows(self, rows):
+        rows = [row if isinstance(row, dict) else {} for row in rows]
+        ids = {row["id"] for row in rows if isinstance(row.get("id"), int)}
+        slugs = {row["slug"] for row in rows if "id" not in row and row.get("slug")}
+        category_ids = set()
+        for row in rows:
+            try:
+                category_ids.add(int(row["category"]))
+            except (KeyError, TypeError, ValueError):
+                pass
+
+        by_id = Product.objects.in_bulk(ids)
+        by_slug = {}
+        for product in Product.objects.filter(slug__in=slugs).order_by("-id"):
+            by_slug[product.slug] = product  # oldest wins on duplicate slugs
+        self.context["categories"] = Category.objects.in_bulk(category_ids)
+
+        seen = set()
+        for row in rows:
+            if "id" in row:
+                instance = by_id.get(row["id"])
+                if instance is None:
+                    yield None, {"id": ["Product not found."]}
+                    continue
+            else:
+                instance = by_slug.get(row.get("slug"))
+            if instance is not None:
+                if instance.pk in seen:
+                    yield None, {"non_field_errors": ["Product appears more than once in this batch."]}
+                    continue
+                seen.add(instance.pk)
+            yield instance, None
+
+    def run_child_validation(self, data):
+        instance, errors = next(self._matches)
+        if errors:
+            raise serializers.ValidationError(errors)
+        self.child.instance = instance
+        self.child.initial_data = data
+        # Fields check `root.partial` to decide whether missing values are
+        # an error, so it has to be switched per row.
+        self.partial = instance is not None
+        try:
+            return instance, super().run_child_validation(data)
+        finally:
+            self.partial = False
+            self.child.instance = None
+
+    def save(self, **kwargs):
+        now = timezone.now()
+        to_create, to_update, results = [], [], []
+        update_fields = {"updated"}
+        deltas = defaultdict(lambda: [0, 0])
+
+        for instance, attrs in self.validated_data:
+            attrs = ProductSerializer.fill_slug(attrs, instance)
+            if instance is None:
+                product = Product(**attrs)
+                to_create.append(product)
+                results.append(("created", product))
+                before = None
+            else:
+                product = instance
+                before = count_state(product)
+                for attr, value in attrs.items():
+                    setattr(product, attr, value)
+                product.updated = now
+                update_fields.update(attrs)
+                to_update.append(product)
+                results.append(("updated", product))
+            for category_id, (total, in_stock) in state_deltas(before, count_state(product)).items():
+                deltas[category_id][0] += total
+                deltas[category_id][1] += in_stock
+
+        with transaction.atomic():
+            Product.objects.bulk_create(to_create, batch_size=self.write_batch_size)
+            if to_update:
+                bulk_update_grouped(
+                    Product, to_update, sorted(update_fields), batch_size=self.write_batch_size
+                )
+            # Bulk writes send no signals: keep counters and the response
+            # cache in step by hand.
+            apply_category_deltas(deltas)
+            transaction.on_commit(bump_catalog_version)
+
+        self.instance = [product for _, product in results]
+        self.results = [
+            {"index": index, "status": result, "id": product.pk, "slug": product.slug}
+            for index, (result, product) in enumerate(results)
+        ]
+        return self.instance
 
 
 
@@ -68,7 +228,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         fields = ("username", "email", "password")
 
     def create(self, validated_data):
-        return User.objects.create_user(
+        return create_user(
             username=validated_data["username"],
             email=validated_data.get("email"),
             password=validated_data["password"]
@@ -79,7 +239,7 @@ class LogoutSerializer(serializers.Serializer):
     refresh = serializers.CharField()
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     username = serializers.CharField(source="user.username", read_only=True)
     email = serializers.EmailField(source="user.email", read_only=True)
 
@@ -89,7 +249,7 @@ class ProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ["created_at"]
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=False)
     profile = ProfileSerializer(required=False)
 
@@ -100,13 +260,12 @@ class UserSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         profile_data = validated_data.pop("profile", {})
-        user = User.objects.create_user(
+        return create_user(
             username=validated_data['username'],
             email=validated_data.get('email'),
-            password=validated_data['password']
+            password=validated_data['password'],
+            **profile_data
         )
-        Profile.objects.update_or_create(user=user, defaults=profile_data)
-        return user
 
     def update(self, instance, validated_data):
         profile_data = validated_data.pop("profile", {})
@@ -115,11 +274,19 @@ class UserSerializer(serializers.ModelSerializer):
         if "password" in validated_data:
             instance.set_password(validated_data["password"])
         instance.save()
-        Profile.objects.update_or_create(user=instance, defaults=profile_data)
+        if profile_data:
+            try:
+                profile = instance.profile
+            except Profile.DoesNotExist:
+                Profile.objects.create(user=instance, **profile_data)
+            else:
+                for field, value in profile_data.items():
+                    setattr(profile, field, value)
+                profile.save(update_fields=list(profile_data))
         return instance
 
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source="product.name", read_only=True)
     product_price = serializers.DecimalField(
         source="product.price", max_digits=10, decimal_places=2, read_only=True
@@ -136,18 +303,22 @@ class CartItemSerializer(serializers.ModelSerializer):
 
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
     total_price = serializers.SerializerMethodField()
+    total_items = serializers.SerializerMethodField()
 
     class Meta:
         model = Cart
-        fields = ["id", "user", "items", "total_price", "status", "created_at", "updated_at"]
-        read_only_fields = ["id", "user", "items", "total_price", "created_at", "updated_at"]
+        fields = ["id", "user", "items", "total_price", "total_items", "status", "created_at", "updated_at"]
+        read_only_fields = ["id", "user", "items", "total_price", "total_items", "created_at", "updated_at"]
         
     def get_total_price(self, obj):
         return obj.total_price()
 
+    def get_total_items(self, obj):
+        return obj.total_items()
+
 
 class AddCartItemSerializer(serializers.ModelSerializer):
     class Meta:
@@ -159,9 +330,22 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         return CartItem.objects.create(**validated_data)
 
 
-class OrderSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, read_only=True)
+class OrderItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    product_name = serializers.CharField(source="product.name", read_only=True)
+    subtotal = serializers.SerializerMethodField()
+
+    class Meta:
+        model = OrderItem
+        fields = ["id", "product", "product_name", "price", "quantity", "subtotal"]
+        read_only_fields = fields
+
+    def get_subtotal(self, obj):
+        return obj.subtotal()
+
+
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
 
     class Meta:
         model = Order
-        fields = ["id", "user", "created_at", "items"]
\ No newline at end of file
+        fields = ["id", "user", "status", "total", "item_count", "created_at", "items"]
\ No newline at end of file
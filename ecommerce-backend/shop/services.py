@@ -0,0 +1,181 @@
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.db.models.functions import Now
+
+from .cache import bump_catalog_version
+from .counters import apply_category_deltas, count_state, state_deltas
+from .models import Cart, CartItem, Order, OrderItem, Product, StockHold
+
+
+def create_user(username, password, email=None, **profile_fields):
+    """
+    Create a user and its profile with one INSERT each: the post_save
+    receiver creates the profile from `profile_fields`, so it is never
+    written empty and then updated.
+    """
+    user = User(
+        username=User.normalize_username(username),
+        email=User.objects.normalize_email(email),
+    )
+    user.set_password(password)
+    user._profile_fields = profile_fields
+    with transaction.atomic():
+        user.save()
+    return user
+
+
+class CheckoutError(Exception):
+    def __init__(self, message, products=None, code="invalid"):
+        super().__init__(message)
+        self.message = message
+        self.products = products or []
+        # Machine-readable reason, used as the checkout metrics outcome.
+        self.code = code
+
+
+def grouped_case(values, output_field):
+    """
+    CASE mapping {pk: value} with one branch per distinct value
+    (`WHEN id IN (...)`) rather than one per row.
+    """
+    by_value = defaultdict(list)
+    for pk, value in values.items():
+        by_value[value].append(pk)
+    return Case(
+        *(When(id__in=ids, then=Value(value)) for value, ids in by_value.items()),
+        default=Value(0),
+        output_field=output_field,
+    )
+
+
+def checkout_cart(cart):
+    """
+    Turn an active cart into an order in one transaction.
+
+    Query count doesn't depend on the number of lines: the cart row and all
+    of its products are locked up front (products in id order, so two
+    overlapping checkouts can't deadlock), stock is decremented and the
+    cart's reservations released by a single conditional UPDATE, and
+    order items are written with bulk_create using the locked prices as
+    the snapshot.
+    """
+    with transaction.atomic():
+        cart = Cart.objects.select_for_update().get(pk=cart.pk)
+        if cart.status != "active":
+            raise CheckoutError("Only active carts can be checked out", code="inactive_cart")
+
+        items = list(
+            CartItem.objects.filter(cart=cart).values_list("product_id", "quantity", "hold__quantity")
+        )
+        if not items:
+            raise CheckoutError("Cart is empty", code="empty_cart")
+        quantities = {product_id: quantity for product_id, quantity, _ in items}
+        # Units this cart already reserved count as available to it.
+        held = {product_id: held or 0 for product_id, _, held in items}
+
+        products = {
+            product.id: product
+            for product in Product.objects.select_for_update()
+            .filter(id__in=quantities)
+            .order_by("id")
+        }
+
+        unavailable = [
+            product.slug
+            for product_id, product in products.items()
+            if not product.available
+            or product.stock - product.reserved + held[product_id] < quantities[product_id]
+        ]
+        if unavailable:
+            raise CheckoutError("Insufficient stock", products=unavailable, code="insufficient_stock")
+
+        # The rows are locked so this can't miss, but the guard keeps the
+        # UPDATE correct on backends where select_for_update is a no-op.
+        requested = grouped_case(quantities, PositiveIntegerField())
+        released = grouped_case(held, PositiveIntegerField())
+        updated = Product.objects.filter(
+            id__in=quantities,
+            reserved__gte=released,
+            stock__gte=F("reserved") - released + requested,
+        ).update(
+            stock=F("stock") - requested,
+            reserved=F("reserved") - released,
+            # update() doesn't apply auto_now; ETags are derived from it.
+            updated=Now(),
+        )
+        if updated != len(quantities):
+            raise CheckoutError("Insufficient stock", code="insufficient_stock")
+
+        # update() skips post_save, so account for products whose in_stock
+        # flipped here.
+        deltas = defaultdict(lambda: [0, 0])
+        for product_id, product in products.items():
+            before = count_state(product)
+            product.stock -= quantities[product_id]
+            product.reserved -= held[product_id]
+            for category_id, delta in state_deltas(before, count_state(product)).items():
+                deltas[category_id][0] += delta[0]
+                deltas[category_id][1] += delta[1]
+        apply_category_deltas(deltas)
+
+        order_items = []
+        total = 0
+        for product_id, quantity in quantities.items():
+            product = products[product_id]
+            total += product.price * quantity
+            order_items.append(
+                OrderItem(product=product, quantity=quantity, price=product.price)
+            )
+
+        order = Order.objects.create(
+            user_id=cart.user_id,
+            cart=cart,
+            total=total,
+            item_count=sum(quantities.values()),
+        )
+        for order_item in order_items:
+            order_item.order = order
+        OrderItem.objects.bulk_create(order_items)
+
+        StockHold.objects.filter(cart_item__cart=cart).delete()
+        CartItem.objects.filter(cart=cart).delete()
+        cart.status = "checked_out"
+        cart.save(update_fields=["status", "updated_at"])
+
+        # Stock changed through update(), which sends no post_save.
+        transaction.on_commit(bump_catalog_version)
+
+    return order
+
+
+def bulk_update_grouped(model, objs, fields, batch_size=1000):
+    """
+    Like QuerySet.bulk_update(), but each field's CASE gets one branch per
+    distinct value (`WHEN id IN (...)`) instead of one per row, and a field
+    holding the same value on every row is set directly. Price and stock
+    syncs repeat values heavily, so statements and Django's expression
+    compilation shrink accordingly.
+    """
+    updated = 0
+    for start in range(0, len(objs), batch_size):
+        batch = objs[start:start + batch_size]
+        changes = {}
+        for name in fields:
+            field = model._meta.get_field(name)
+            groups = defaultdict(list)
+            for obj in batch:
+                groups[getattr(obj, field.attname)].append(obj.pk)
+            if len(groups) == 1:
+                (value,) = groups
+                changes[field.attname] = Value(value, output_field=field)
+            else:
+                changes[field.attname] = Case(
+                    *(When(pk__in=pks, then=Value(value, output_field=field))
+                      for value, pks in groups.items()),
+                    output_field=field,
+                )
+        updated += model._base_manager.filter(pk__in=[obj.pk for obj in batch]).update(**changes)
+    return updated
@@ -1,18 +1,77 @@
 # shop/signals.py
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile
+from .models import Profile, Product, Category
+from .authentication import invalidate_user
+from .cache import bump_catalog_version
+from .counters import apply_category_deltas, count_state, recount_categories, state_deltas
 
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    """
+    Every user gets a profile, whichever path created it (API, admin,
+    createsuperuser). Profile fields known at creation time ride along on
+    `instance._profile_fields` so the row is written once. Saving an existing
+    user doesn't touch the profile: nothing on it depends on the user row.
+    """
+    if created and not raw:
+        Profile.objects.create(user=instance, **getattr(instance, "_profile_fields", {}))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Covers deactivation (is_active=False) and password changes.
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(pre_save, sender=Product)
+def reset_image_variants(sender, instance, raw=False, **kwargs):
+    # A new image makes the stored variants stale; generate_image_variants
+    # picks up rows whose variants are NULL.
+    if raw or not instance.image_variants:
+        return
+    if instance.image_variants.get("source") != (instance.image.name or ""):
+        instance.image_variants = None
+
+
+@receiver(post_save, sender=Product)
+def update_category_counts_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    after = count_state(instance)
     if created:
-        Profile.objects.create(user=instance)
+        before = None
+    elif hasattr(instance, "_counted_state"):
+        before = instance._counted_state
     else:
-        instance.profile.save()
-        
-        
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
+        # Saved without being loaded first (e.g. built with an explicit pk):
+        # the previous state is unknown, so recount its category instead.
+        recount_categories([instance.category_id])
+        instance._counted_state = after
+        return
+    if before != after:
+        apply_category_deltas(state_deltas(before, after))
+    instance._counted_state = after
+
+
+@receiver(post_delete, sender=Product)
+def update_category_counts_on_delete(sender, instance, **kwargs):
+    before = getattr(instance, "_counted_state", count_state(instance))
+    apply_category_deltas(state_deltas(before, None))
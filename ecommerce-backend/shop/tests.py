@@ -1,3 +1,1258 @@
-from django.test import TestCase
+import contextvars
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from base64 import b64decode, b64encode
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .authentication import user_cache
+from .benchmarks import percentile, seed_catalog, summarize
+from .cache import catalog_cache
+from .counters import recount_categories
+from .images import generate_pending_variants
+from .instrumentation import RequestMetrics, _current
+from .management.commands.bench_endpoints import THRESHOLDS, Command as BenchEndpoints
+from .metrics import record_pool_stats
+from .models import Cart, CartItem, Category, Order, OrderItem, Product, Profile, StockHold
+from .reservations import InsufficientStock, release_expired_holds, reserve
+from .routing import ReplicaRouter, use_replica
+from .services import CheckoutError, checkout_cart
+from .tokens import BloomFilter, blacklist_filter, prune_outstanding_tokens
+
+
+def make_product(stock, **kwargs):
+    category, _ = Category.objects.get_or_create(slug="widgets", defaults={"name": "Widgets"})
+    fields = {"category": category, "name": "Widget", "slug": "widget", "price": 5, **kwargs}
+    return Product.objects.create(stock=stock, **fields)
+
+
+def make_item(username, product, quantity=1):
+    user = User.objects.create_user(username=username, password="x")
+    cart = Cart.objects.create(user=user)
+    return CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        for i in range(25):
+            make_product(stock=i, name=f"Widget {i}", slug=f"widget-{i}", price=i % 5)
+        self.client = APIClient()
+
+    def walk(self, params):
+        response = self.client.get("/api/products/", params)
+        slugs = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            slugs += [p["slug"] for p in response.data["results"]]
+            if not response.data["next"]:
+                return slugs, response
+            response = self.client.get(response.data["next"])
+
+    def test_cursor_walks_every_row_once_in_both_directions(self):
+        for ordering in (None, "price", "-price", "updated"):
+            params = {"pagination": "cursor", "page_size": 4}
+            if ordering:
+                params["ordering"] = ordering
+            slugs, response = self.walk(params)
+            self.assertEqual(len(slugs), 25)
+            self.assertEqual(len(set(slugs)), 25)
+
+            back = [p["slug"] for p in response.data["results"]]
+            while response.data["previous"]:
+                response = self.client.get(response.data["previous"])
+                back = [p["slug"] for p in response.data["results"]] + back
+            self.assertEqual(back, slugs)
+
+    def test_page_numbers_stay_the_default(self):
+        response = self.client.get("/api/products/")
+        self.assertEqual(response.data["count"], 25)
+
+    def test_invalid_cursors_are_404(self):
+        first = self.client.get("/api/products/", {"pagination": "cursor", "ordering": "price"})
+        cursor = parse_qs(urlparse(first.data["next"]).query)["cursor"][0]
+        payload = json.loads(b64decode(cursor))
+        tampered = [
+            "junk",
+            {**payload, "p": "not-a-list"},
+            {**payload, "p": payload["p"][:1]},
+            {**payload, "p": ["cheap", *payload["p"][1:]]},
+            {**payload, "o": ["-price", "-id"]},
+        ]
+        for value in tampered:
+            if not isinstance(value, str):
+                value = b64encode(json.dumps(value).encode()).decode()
+            response = self.client.get("/api/products/", {"ordering": "price", "cursor": value})
+            self.assertEqual(response.status_code, 404, value)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        make_product(
+            stock=1, name="Running shoes", slug="shoes", price=50, description="Light shoes for running"
+        )
+        make_product(
+            stock=0, name="Wool hat", slug="hat", description="Keeps you warm while running errands in winter"
+        )
+        make_product(stock=3, name="Coffee mug", slug="mug", description="Stoneware")
+        self.client = APIClient()
+
+    def search(self, **params):
+        response = self.client.get("/api/products/", params)
+        self.assertEqual(response.status_code, 200)
+        return [p["slug"] for p in response.data["results"]]
+
+    def test_matches_are_ranked_by_relevance(self):
+        self.assertEqual(self.search(search="running"), ["shoes", "hat"])
+        self.assertEqual(self.search(search="running", ordering="price"), ["hat", "shoes"])
+        self.assertEqual(self.search(search="running", in_stock="true"), ["shoes"])
+
+    def test_index_follows_edits(self):
+        Product.objects.filter(slug="mug").update(name="Running mug")
+        self.assertEqual(self.search(search="mug"), ["mug"])
+        self.assertIn("mug", self.search(search="running"))
+        Product.objects.filter(slug="hat").delete()
+        self.assertEqual(sorted(self.search(search="running")), ["mug", "shoes"])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search(search='running" OR mug'), [])
+
+    def test_cursor_pages_of_matches_fall_back_to_the_default_ordering(self):
+        response = self.client.get(
+            "/api/products/", {"search": "running", "pagination": "cursor", "page_size": 1}
+        )
+        self.assertEqual([p["slug"] for p in response.data["results"]], ["hat"])
+        response = self.client.get(response.data["next"])
+        self.assertEqual([p["slug"] for p in response.data["results"]], ["shoes"])
+        self.assertIsNone(response.data["next"])
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        catalog_cache().clear()
+        self.product = make_product(stock=2)
+        self.client = APIClient()
+
+    def test_equivalent_queries_share_an_entry(self):
+        first = self.client.get("/api/products/?b=&ordering=price&page=1")
+        second = self.client.get("/api/products/?page=1&ordering=price")
+        self.assertEqual((first["X-Cache"], second["X-Cache"]), ("MISS", "HIT"))
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(self.client.get("/api/products/?ordering=-price")["X-Cache"], "MISS")
+
+    def test_hits_only_run_the_validator_query(self):
+        for url in ("/api/products/", "/api/products/widget/"):
+            self.client.get(url)
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_writes_invalidate_every_entry(self):
+        for url in ("/api/products/", "/api/products/widget/", "/api/categories/"):
+            self.client.get(url)
+            self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+        self.product.price = 7
+        self.product.save()
+        response = self.client.get("/api/products/widget/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["price"], "7.00")
+
+        make_product(stock=0, slug="gadget")
+        response = self.client.get("/api/products/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(self.client.get("/api/categories/")["X-Cache"], "MISS")
+
+
+class CheckoutTests(TestCase):
+    def make_cart(self, username, lines):
+        products = [
+            make_product(stock=5, name=f"Widget {i}", slug=f"{username}-{i}", price=Decimal("2.50"))
+            for i in range(lines)
+        ]
+        item = make_item(username, products[0], quantity=2)
+        CartItem.objects.bulk_create(
+            CartItem(cart=item.cart, product=product, quantity=2) for product in products[1:]
+        )
+        return item.cart, products
+
+    def checkout_queries(self, cart):
+        with CaptureQueriesContext(connection) as queries:
+            order = checkout_cart(cart)
+        return order, len(queries)
+
+    def test_query_count_does_not_grow_with_lines(self):
+        small, _ = self.make_cart("a", 1)
+        large, products = self.make_cart("b", 8)
+        _, small_queries = self.checkout_queries(small)
+        order, large_queries = self.checkout_queries(large)
+        self.assertEqual(small_queries, large_queries)
+
+        self.assertEqual((order.total, order.item_count), (Decimal("40.00"), 16))
+        self.assertEqual(order.items.count(), 8)
+        self.assertTrue(all(item.price == Decimal("2.50") for item in order.items.all()))
+        self.assertEqual(Product.objects.filter(id__in=[p.id for p in products], stock=3).count(), 8)
+        large.refresh_from_db()
+        self.assertEqual(large.status, "checked_out")
+        self.assertFalse(CartItem.objects.filter(cart=large).exists())
+
+    def test_insufficient_stock_changes_nothing(self):
+        cart, products = self.make_cart("c", 3)
+        Product.objects.filter(pk=products[1].pk).update(stock=1)
+        with self.assertRaises(CheckoutError) as raised:
+            checkout_cart(cart)
+        self.assertEqual(raised.exception.products, [products[1].slug])
+        self.assertEqual(sorted(Product.objects.values_list("stock", flat=True)), [1, 5, 5])
+        self.assertFalse(Order.objects.exists())
+        cart.refresh_from_db()
+        self.assertEqual(cart.status, "active")
+
+    def test_checked_out_cart_cannot_be_checked_out_again(self):
+        cart, _ = self.make_cart("d", 1)
+        checkout_cart(cart)
+        with self.assertRaises(CheckoutError) as raised:
+            checkout_cart(cart)
+        self.assertEqual(raised.exception.code, "inactive_cart")
+
+
+class CartReadTests(TestCase):
+    def setUp(self):
+        self.item = make_item("erin", make_product(stock=9, price=Decimal("1.50")), quantity=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.item.cart.user)
+
+    def add_lines(self, count):
+        products = [
+            make_product(stock=9, name=f"Widget {i}", slug=f"widget-{i}", price=Decimal("1.50"))
+            for i in range(count)
+        ]
+        CartItem.objects.bulk_create(
+            CartItem(cart=self.item.cart, product=product, quantity=2) for product in products
+        )
+
+    def assert_my_cart(self, lines):
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/cart/my-cart/")
+        self.assertEqual(len(response.data["items"]), lines)
+        self.assertEqual(response.data["total_items"], 2 * lines)
+        self.assertEqual(Decimal(str(response.data["total_price"])), Decimal("3.00") * lines)
+
+    def test_my_cart_query_count_does_not_grow_with_lines(self):
+        self.assert_my_cart(lines=1)
+        self.add_lines(29)
+        self.assert_my_cart(lines=30)
+
+    def test_totals_without_prefetch_are_aggregated(self):
+        self.add_lines(4)
+        cart = Cart.objects.get(pk=self.item.cart_id)
+        with self.assertNumQueries(2):
+            self.assertEqual(cart.total_price(), Decimal("15.00"))
+            self.assertEqual(cart.total_items(), 10)
+
+
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        self.user = make_item("frank", make_product(stock=9)).cart.user
+        products = [
+            make_product(stock=9, name=f"Widget {i}", slug=f"widget-{i}", price=Decimal("1.50"))
+            for i in range(5)
+        ]
+        for _ in range(15):
+            order = Order.objects.create(user=self.user, total=Decimal("7.50"), item_count=5)
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=product, price=product.price) for product in products
+            )
+        # Someone else's order stays out of the history.
+        other = User.objects.create_user(username="grace", password="x")
+        Order.objects.create(user=other, total=1, item_count=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_are_prefetched_newest_first(self):
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/orders/my-orders/")
+        self.assertEqual(response.data["count"], 15)
+        newest = Order.objects.filter(user=self.user).latest("created_at", "id")
+        self.assertEqual(response.data["results"][0]["id"], newest.id)
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertEqual(response.data["results"][0]["item_count"], 5)
+        self.assertEqual(len(response.data["results"][0]["items"]), 5)
+
+        response = self.client.get("/api/orders/my-orders/", {"page": 2})
+        self.assertEqual(len(response.data["results"]), 5)
+        self.assertIsNone(response.data["next"])
+
+
+class CategoryCounterTests(TestCase):
+    def setUp(self):
+        self.empty = make_product(stock=0, slug="empty")
+        self.stocked = make_product(stock=2, slug="stocked")
+        self.widgets = self.empty.category
+        self.gadgets = Category.objects.create(name="Gadgets", slug="gadgets")
+
+    def counts(self):
+        return {c.slug: (c.product_count, c.in_stock_count) for c in Category.objects.all()}
+
+    def test_counters_follow_product_saves_and_deletes(self):
+        self.assertEqual(self.counts(), {"widgets": (2, 1), "gadgets": (0, 0)})
+
+        self.empty.stock = 3
+        self.empty.save()
+        self.assertEqual(self.counts(), {"widgets": (2, 2), "gadgets": (0, 0)})
+
+        self.empty.category = self.gadgets
+        self.empty.save()
+        self.assertEqual(self.counts(), {"widgets": (1, 1), "gadgets": (1, 1)})
+
+        self.stocked.delete()
+        self.assertEqual(self.counts(), {"widgets": (0, 0), "gadgets": (1, 1)})
+
+    def test_recount_repairs_drift(self):
+        Product.objects.filter(pk=self.stocked.pk).update(stock=0)
+        Category.objects.update(product_count=7)
+        recount_categories()
+        self.assertEqual(self.counts(), {"widgets": (2, 0), "gadgets": (0, 0)})
+
+    def test_category_products_are_filtered_and_paginated(self):
+        for i in range(15):
+            make_product(stock=i % 2, slug=f"gadget-{i}", price=i, category=self.gadgets)
+        response = APIClient().get(
+            "/api/categories/gadgets/products/",
+            {"in_stock": "true", "ordering": "-price", "page_size": 3},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 7)
+        self.assertEqual([p["price"] for p in response.data["results"]], ["13.00", "11.00", "9.00"])
+
+        categories = APIClient().get("/api/categories/").data["results"]
+        self.assertEqual(
+            {c["slug"]: (c["product_count"], c["in_stock_count"]) for c in categories},
+            {"widgets": (2, 1), "gadgets": (15, 7)},
+        )
+
+
+class CatalogImportExportTests(TestCase):
+    def setUp(self):
+        make_product(stock=3, slug="red-shoe", name="Red shoe", price=Decimal("9.50"), description="Suede")
+        make_product(stock=0, slug="blue-shoe", name="Blue shoe", available=False)
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def snapshot(self):
+        return sorted(Product.objects.values_list(
+            "slug", "name", "description", "price", "stock", "available", "category__slug"
+        ))
+
+    def import_file(self, name, content, *args):
+        path = os.path.join(self.tmp, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        out, err = StringIO(), StringIO()
+        call_command("import_products", path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_export_and_import_round_trip(self):
+        before = self.snapshot()
+        for file_format in ("csv", "jsonl"):
+            path = os.path.join(self.tmp, f"products.{file_format}")
+            call_command("export_products", path)
+            Product.objects.all().delete()
+
+            out, err = StringIO(), StringIO()
+            call_command("import_products", path, "--chunk-size", "1", stdout=out, stderr=err)
+            self.assertIn("2 created, 0 updated, 0 rejected", out.getvalue())
+            self.assertEqual(err.getvalue(), "")
+            self.assertEqual(self.snapshot(), before)
+        category = Category.objects.get(slug="widgets")
+        self.assertEqual((category.product_count, category.in_stock_count), (2, 1))
+
+    def test_rows_are_upserted_by_slug_and_bad_rows_reported(self):
+        out, err = self.import_file("in.csv", (
+            "name,slug,description,price,stock,available,category\n"
+            "Red shoe,red-shoe,,12,1,true,widgets\n"
+            "Green shoe,,,5,2,yes,widgets\n"
+            "Bad price,,,x,1,1,widgets\n"
+            "Hat,,,2,1,1,hats\n"
+        ))
+        self.assertIn("1 created, 1 updated, 2 rejected", out)
+        self.assertIn("line 4: invalid price 'x'", err)
+        self.assertIn("line 5: unknown category 'hats'", err)
+        self.assertEqual(Product.objects.get(slug="red-shoe").price, Decimal("12"))
+        self.assertTrue(Product.objects.filter(slug="green-shoe").exists())
+
+        out, err = self.import_file("prices.csv", (
+            "name,price,category\n"
+            "Not a number,NaN,widgets\n"
+            "Endless,Infinity,widgets\n"
+            "Too dear,123456789.00,widgets\n"
+            "Too precise,1.005,widgets\n"
+            f"{'x' * 256},1,widgets\n"
+            "Fine,1,widgets\n"
+        ))
+        self.assertIn("1 created, 0 updated, 5 rejected", out)
+        self.assertIn("line 2: invalid price 'NaN'", err)
+        self.assertIn("line 3: invalid price 'Infinity'", err)
+        self.assertIn("line 4: invalid price '123456789.00': Ensure that there are no more than 10 digits", err)
+        self.assertIn("line 5: invalid price '1.005'", err)
+        self.assertIn("line 6: name is longer than 255 characters", err)
+
+        out, _ = self.import_file(
+            "more.jsonl", '{"name": "Hat", "price": "2", "category": "hats"}\n', "--create-categories"
+        )
+        self.assertIn("1 created", out)
+        self.assertEqual(Category.objects.get(slug="hats").product_count, 1)
+
+    def test_export_endpoint_streams_for_staff_only(self):
+        client = APIClient()
+        self.assertIn(client.get("/api/products/export/").status_code, (401, 403))
+
+        client.force_authenticate(User.objects.create_superuser("admin", "a@example.com", "x"))
+        response = client.get("/api/products/export/", {"file_format": "jsonl", "in_stock": "true"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["slug"] for row in rows], ["red-shoe"])
+        self.assertEqual(client.get("/api/products/export/", {"file_format": "xml"}).status_code, 400)
+
+
+class ProductBatchTests(TestCase):
+    def setUp(self):
+        self.product = make_product(stock=0)
+        self.category = self.product.category
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser("admin", "a@example.com", "x"))
+
+    def post(self, rows):
+        return self.client.post("/api/products/batch/", rows, format="json")
+
+    def batch_queries(self, updates, creates):
+        products = [
+            make_product(stock=0, name=f"Widget {i}", slug=f"widget-{updates}-{i}")
+            for i in range(updates)
+        ]
+        rows = [{"id": product.id, "price": "3.00", "stock": 4} for product in products]
+        rows += [
+            {"name": f"New {updates}-{i}", "price": "2", "category": self.category.id, "stock": 1}
+            for i in range(creates)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(rows)
+        self.assertEqual(response.status_code, 200, response.data)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.assertEqual(
+            self.batch_queries(updates=2, creates=1), self.batch_queries(updates=20, creates=10)
+        )
+        self.assertEqual(Product.objects.filter(price=Decimal("3.00"), stock=4).count(), 22)
+        self.category.refresh_from_db()
+        self.assertEqual((self.category.product_count, self.category.in_stock_count), (34, 33))
+
+    def test_rows_match_by_id_or_slug(self):
+        gadgets = Category.objects.create(name="Gadgets", slug="gadgets")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post([
+                {"slug": "widget", "stock": 2, "category": gadgets.id},
+                {"name": "Gadget", "price": "1.50", "category": gadgets.id},
+            ])
+        self.assertEqual(
+            [(row["status"], row["slug"]) for row in response.data["results"]],
+            [("updated", "widget"), ("created", "gadget")],
+        )
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.category_id), (2, gadgets.id))
+        self.assertEqual(
+            {c.slug: (c.product_count, c.in_stock_count) for c in Category.objects.all()},
+            {"widgets": (0, 0), "gadgets": (2, 1)},
+        )
+
+    def test_invalid_rows_reject_the_whole_batch(self):
+        response = self.post([
+            {"id": self.product.id, "stock": 5},
+            {"id": 999},
+            {"slug": "widget", "price": "-x"},
+            {"name": "No price"},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            {index: sorted(errors) for index, errors in response.data.items()},
+            {1: ["id"], 2: ["non_field_errors"], 3: ["category", "price"]},
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(Product.objects.count(), 1)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(make_item("henry", self.product).cart.user)
+        self.assertEqual(self.post([{"id": self.product.id, "stock": 1}]).status_code, 403)
+
+
+class RegistrationTests(TestCase):
+    def test_profile_is_written_once_with_registration_data(self):
+        response = APIClient().post(
+            "/api/auth/register/",
+            {"username": "ann", "password": "pw", "profile": {"bio": "hi"}},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["profile"]["bio"], "hi")
+        self.assertEqual(Profile.objects.get(user__username="ann").bio, "hi")
+
+    def test_saving_a_user_does_not_write_the_profile(self):
+        user = User.objects.create_user(username="bob", password="pw")
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+        with self.assertNumQueries(1):
+            user.save()
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(username="carol", password="pw")
+        token = APIClient().post(
+            "/api/auth/login/", {"username": "carol", "password": "pw"}, format="json"
+        ).data["access"]
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_second_request_skips_user_and_profile_queries(self):
+        self.client.get("/api/users/me/")
+        hits = user_cache.hits
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/users/me/")
+        self.assertEqual(response.data["username"], "carol")
+        self.assertEqual(user_cache.hits, hits + 1)
+
+    def test_deactivation_invalidates_entry(self):
+        self.assertEqual(self.client.get("/api/users/me/").status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/users/me/").status_code, 401)
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        blacklist_filter.reset()
+        User.objects.create_user(username="dave", password="pw")
+        self.client = APIClient()
+        tokens = self.client.post(
+            "/api/auth/login/", {"username": "dave", "password": "pw"}, format="json"
+        ).data
+        self.refresh = tokens["refresh"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000)
+        keys = [f"jti-{i}" for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_logged_out_refresh_token_is_rejected(self):
+        response = self.client.post("/api/auth/refresh/", {"refresh": self.refresh}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(blacklist_filter.negatives, 1)
+
+        self.client.post("/api/auth/logout/", {"refresh": self.refresh}, format="json")
+        response = self.client.post("/api/auth/refresh/", {"refresh": self.refresh}, format="json")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(blacklist_filter.confirmed, 1)
+
+    def test_prune_deletes_expired_tokens_in_chunks(self):
+        self.client.post("/api/auth/logout/", {"refresh": self.refresh}, format="json")
+        expired = timezone.now() - timedelta(days=1)
+        OutstandingToken.objects.bulk_create(
+            OutstandingToken(jti=f"old-{i}", token="x", expires_at=expired) for i in range(5)
+        )
+        OutstandingToken.objects.update(expires_at=expired)
+
+        self.assertEqual(prune_outstanding_tokens(chunk_size=2), 6)
+        self.assertFalse(OutstandingToken.objects.exists())
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class StockReservationTests(TestCase):
+    def test_reserve_adjusts_by_difference(self):
+        product = make_product(stock=5)
+        item = make_item("a", product)
+
+        reserve(item, 3)
+        reserve(item, 1)
+        product.refresh_from_db()
+        self.assertEqual(product.reserved, 1)
+        self.assertEqual(product.available_stock, 4)
+
+        with self.assertRaises(InsufficientStock):
+            reserve(item, 6)
+        product.refresh_from_db()
+        self.assertEqual(product.reserved, 1)
+
+    def test_held_units_hide_product_from_in_stock_count(self):
+        product = make_product(stock=2)
+        reserve(make_item("a", product), 2)
+        product.refresh_from_db()
+        self.assertFalse(product.in_stock)
+        self.assertEqual(Category.objects.get().in_stock_count, 0)
+
+    def test_expired_holds_are_released(self):
+        product = make_product(stock=5)
+        reserve(make_item("a", product), 2, ttl=timedelta(seconds=-1))
+        reserve(make_item("b", product), 1)
+
+        self.assertEqual(release_expired_holds(batch_size=1), 1)
+        product.refresh_from_db()
+        self.assertEqual(product.reserved, 1)
+        self.assertEqual(StockHold.objects.count(), 1)
+
+    def test_checkout_consumes_hold(self):
+        product = make_product(stock=3)
+        item = make_item("a", product, quantity=3)
+        reserve(item, 3)
+
+        checkout_cart(item.cart)
+        product.refresh_from_db()
+        self.assertEqual((product.stock, product.reserved), (0, 0))
+        self.assertFalse(StockHold.objects.exists())
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.product = make_product(stock=5)
+        self.client = APIClient()
+
+    def test_matching_etag_gets_304_without_serializing(self):
+        for url in ["/api/products/", "/api/products/widget/", "/api/categories/"]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("public", response["Cache-Control"])
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(response.status_code, 304)
+
+    @mock.patch("shop.signals.bump_catalog_version")
+    def test_category_etags_follow_the_rows_not_the_catalog_version(self, bump):
+        # Without a shared cache, other workers never see this process's
+        # catalog version bumps; the validators must change regardless.
+        etags = {url: self.client.get(url)["ETag"] for url in ["/api/categories/", "/api/categories/widgets/"]}
+        reserve(make_item("a", self.product), 5)
+        for url, etag in etags.items():
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, url)
+            etags[url] = response["ETag"]
+        self.assertEqual(response.data["in_stock_count"], 0)
+
+        category = Category.objects.get(slug="widgets")
+        category.name = "Gizmos"
+        category.save()
+        for url, etag in etags.items():
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200, url)
+        self.assertEqual(self.client.get("/api/categories/missing/").status_code, 404)
+
+    def test_etag_changes_when_stock_is_reserved(self):
+        response = self.client.get("/api/products/widget/")
+        self.assertIn("Last-Modified", response)
+        reserve(make_item("a", self.product), 2)
+
+        response = self.client.get("/api/products/widget/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["available_stock"], 3)
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        shoes = Category.objects.create(name="Shoes", slug="shoes")
+        hats = Category.objects.create(name="Hats", slug="hats")
+        for i, (category, price, stock) in enumerate(
+            [(shoes, 5, 1), (shoes, 15, 0), (shoes, 45, 3), (hats, 12, 2)]
+        ):
+            Product.objects.create(
+                category=category, name=f"Blue thing {i}", slug=f"thing-{i}", price=price, stock=stock
+            )
+
+    def test_facets_in_one_aggregation_query(self):
+        with self.assertNumQueries(2):  # validators + the facet GROUP BY
+            response = self.client.get("/api/products/facets/?price_buckets=10,20")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "count": 4,
+            "in_stock": 3,
+            "categories": [
+                {"slug": "shoes", "name": "Shoes", "count": 3},
+                {"slug": "hats", "name": "Hats", "count": 1},
+            ],
+            "price": [
+                {"min": None, "max": "10", "count": 1},
+                {"min": "10", "max": "20", "count": 2},
+                {"min": "20", "max": None, "count": 1},
+            ],
+        })
+
+        response = self.client.get("/api/products/facets/?price_buckets=20,10")
+        self.assertEqual(response["X-Cache"], "MISS")
+        response = self.client.get("/api/products/facets/?price_buckets=10,20")
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_facets_follow_filters_and_search(self):
+        response = self.client.get("/api/products/facets/?in_stock=true&search=blue&min_price=10")
+        data = response.json()
+        self.assertEqual((data["count"], data["in_stock"]), (2, 2))
+        self.assertEqual(self.client.get("/api/products/facets/?price_buckets=x").status_code, 400)
+
+    def test_invalid_price_buckets_are_rejected(self):
+        for value in ["NaN", "sNaN", "10,NaN", "Infinity", "-5", ","]:
+            response = self.client.get("/api/products/facets/", {"price_buckets": value})
+            self.assertEqual(response.status_code, 400, value)
+            self.assertIn("price_buckets", response.json())
+
+
+class AsyncCatalogTests(TestCase):
+    def setUp(self):
+        # Created out of name order, so id order and model ordering differ.
+        gadgets = Category.objects.create(name="Gadgets", slug="gadgets")
+        make_product(stock=5, description="A running companion")
+        Category.objects.create(name="Accessories", slug="accessories")
+        for i in range(12):
+            make_product(
+                stock=i % 3, name=f"Gadget {i}", slug=f"gadget-{i}", price=i + 1,
+                description="Good for running" if i % 4 == 0 else "", category=gadgets,
+            )
+        catalog_cache().clear()
+
+    def test_async_views_match_sync_views(self):
+        client = APIClient()
+        for path in [
+            "products/",
+            "products/?page=2&page_size=3&ordering=-price&in_stock=true",
+            "products/?search=running",
+            "products/?search=running&ordering=price&category=gadgets",
+            "products/widget/",
+            "categories/",
+            "categories/?page_size=2",
+            "categories/gadgets/",
+            "categories/gadgets/products/?page=2&page_size=5",
+            "categories/gadgets/products/?search=running",
+        ]:
+            sync = client.get(f"/api/{path}", HTTP_ACCEPT="application/json")
+            response = self.client.get(f"/api/async/{path}")
+            self.assertEqual(response.status_code, 200, path)
+            expected = json.loads(sync.content.decode().replace("/api/", "/api/async/"))
+            self.assertEqual(response.json(), expected, path)
+            response = self.client.get(f"/api/async/{path}", HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(response.status_code, 304, path)
+
+        categories = self.client.get("/api/async/categories/").json()["results"]
+        self.assertEqual([c["slug"] for c in categories], ["accessories", "gadgets", "widgets"])
+        results = self.client.get("/api/async/products/?search=running").json()["results"]
+        self.assertEqual(len(results), 4)
+
+    def test_async_errors_match_sync_views(self):
+        client = APIClient()
+        for path in ["products/missing/", "products/?page=9", "products/?min_price=cheap"]:
+            sync = client.get(f"/api/{path}", HTTP_ACCEPT="application/json")
+            response = self.client.get(f"/api/async/{path}")
+            self.assertEqual(response.status_code, sync.status_code, path)
+            self.assertEqual(response.json(), sync.json(), path)
+
+    @mock.patch("shop.signals.bump_catalog_version")
+    def test_category_etags_follow_the_rows(self, bump):
+        urls = ["/api/async/categories/", "/api/async/categories/gadgets/"]
+        etags = {url: self.client.get(url)["ETag"] for url in urls}
+        category = Category.objects.get(slug="gadgets")
+        category.name = "Gizmos"
+        category.save()
+        for url, etag in etags.items():
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, url)
+        self.assertEqual(response.json()["name"], "Gizmos")
+        self.assertEqual(self.client.get("/api/async/categories/missing/").status_code, 404)
+
+    def test_cursor_pagination_is_rejected(self):
+        for query in ["pagination=cursor", "cursor=abc"]:
+            response = self.client.get(f"/api/async/products/?{query}")
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("pagination", response.json())
+
+
+def use_temporary_media_root(test):
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root)
+    override = override_settings(MEDIA_ROOT=media_root)
+    override.enable()
+    test.addCleanup(override.disable)
+    return media_root
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        use_temporary_media_root(self)
+
+    def upload(self, size, color="red"):
+        buffer = BytesIO()
+        Image.new("RGB", size, color).save(buffer, "PNG")
+        return SimpleUploadedFile("photo.png", buffer.getvalue(), content_type="image/png")
+
+    def test_variants_are_generated_outside_the_request_and_served_in_the_api(self):
+        product = make_product(stock=1, image=self.upload((1600, 800)))
+        self.assertIsNone(self.client.get("/api/products/widget/").json()["images"])
+
+        self.assertEqual(generate_pending_variants(), (1, 1))
+        images = self.client.get("/api/products/widget/").json()["images"]
+        self.assertEqual(set(images), {"thumbnail", "card", "full"})
+        self.assertEqual((images["card"]["width"], images["card"]["height"]), (400, 200))
+        self.assertRegex(images["thumbnail"]["webp"], r"^/media/products/variants/[0-9a-f]{16}\.webp$")
+        self.assertTrue(images["full"]["jpeg"].endswith(".jpg"))
+
+        # Nothing left to do; a new image makes the variants pending again.
+        self.assertEqual(generate_pending_variants(), (0, 0))
+        product.refresh_from_db()
+        product.image = self.upload((100, 100), color="blue")
+        product.save()
+        self.assertIsNone(self.client.get("/api/products/widget/").json()["images"])
+        self.assertEqual(generate_pending_variants(), (1, 1))
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants["full"]["width"], 100)
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        media_root = use_temporary_media_root(self)
+        os.makedirs(os.path.join(media_root, "products", "variants"))
+        self.name = "products/variants/0123456789abcdef.jpg"
+        with open(os.path.join(media_root, self.name), "wb") as f:
+            f.write(bytes(range(100)))
+
+    def get(self, path, **headers):
+        response = self.client.get(f"/media/{path}", **headers)
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_hashed_file_is_immutable_and_revalidates(self):
+        response, body = self.get(self.name)
+        self.assertEqual((response.status_code, body), (200, bytes(range(100))))
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertIn("immutable", response["Cache-Control"])
+
+        response, _ = self.get(self.name, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.get("products/../../settings.py")[0].status_code, 404)
+
+    def test_byte_ranges(self):
+        response, body = self.get(self.name, HTTP_RANGE="bytes=10-19")
+        self.assertEqual((response.status_code, body), (206, bytes(range(10, 20))))
+        self.assertEqual(response["Content-Range"], "bytes 10-19/100")
+        self.assertEqual(response["Content-Length"], "10")
+
+        self.assertEqual(self.get(self.name, HTTP_RANGE="bytes=-5")[1], bytes(range(95, 100)))
+        self.assertEqual(self.get(self.name, HTTP_RANGE="bytes=100-")[0].status_code, 416)
+        # A stale If-Range gets the whole file.
+        response, body = self.get(self.name, HTTP_RANGE="bytes=0-0", HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, len(body)), (200, 100))
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX="/protected-media/")
+    def test_accel_redirect_hands_the_file_to_the_proxy(self):
+        response, body = self.get(self.name)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.name}")
+        self.assertEqual((body, response["Content-Type"]), (b"", "image/jpeg"))
+
+
+class BootstrapTests(TestCase):
+    def bootstrap(self, *args):
+        out = StringIO()
+        call_command("bootstrap", *args, stdout=out)
+        return out.getvalue()
+
+    @mock.patch.dict(os.environ, {"DJANGO_SUPERUSER_USERNAME": "root"})
+    def test_database_steps_are_skipped_when_done(self):
+        out = self.bootstrap("--skip-static")
+        self.assertIn("migrations: up to date", out)
+        self.assertIn("admin user: created", out)
+        self.assertTrue(User.objects.get(username="root").is_superuser)
+        self.assertIn("admin user: exists", self.bootstrap("--skip-static"))
+
+    def test_static_files_are_collected_once_per_source_change(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        storages = {
+            "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+            # Same manifest as whitenoise's storage, without the compression.
+            "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.ManifestStaticFilesStorage"},
+        }
+        with override_settings(STATIC_ROOT=static_root, STORAGES=storages):
+            self.assertIn("static files: collected", self.bootstrap("--skip-db"))
+            self.assertIn("static files: manifest current", self.bootstrap("--skip-db"))
+            with open(os.path.join(static_root, ".source-fingerprint"), "w") as f:
+                f.write("stale")
+            self.assertIn("static files: collected", self.bootstrap("--skip-db"))
+
+    def test_healthz_does_not_touch_the_database(self):
+        with self.assertNumQueries(0):
+            response = self.client.get("/healthz/")
+        self.assertEqual(response.status_code, 200)
+
+
+class PercentileTests(TestCase):
+    def test_nearest_rank(self):
+        samples = list(range(100, 0, -1))
+        self.assertEqual([percentile(samples, pct) for pct in (50, 95, 99, 100)], [50, 95, 99, 100])
+        self.assertEqual(percentile([], 95), 0.0)
+        summary = summarize([2.0, 1.0, 3.0])
+        self.assertEqual((summary["runs"], summary["mean_ms"], summary["max_ms"]), (3, 2.0, 3.0))
+
+
+# The benchmark runs without a wrapping transaction, so savepoints would
+# skew the query counts under TestCase.
+@override_settings(CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "catalog": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+})
+class EndpointBenchmarkTests(TransactionTestCase):
+    def setUp(self):
+        self.bench = BenchEndpoints()
+        self.bench.rng = random.Random(0)
+        self.bench.data = seed_catalog(categories=3, products=60, users=3, orders_per_user=2)
+        self.bench.in_stock = [p for p in self.bench.data.products if p.stock >= 100]
+        self.bench.anonymous = APIClient()
+        self.bench.clients = {}
+
+    def test_seed_is_reproducible(self):
+        before = list(Product.objects.order_by("slug").values_list("slug", "name", "price", "stock"))
+        Product.objects.all().delete()
+        Category.objects.all().delete()
+        User.objects.all().delete()
+        seed_catalog(categories=3, products=60, users=3, orders_per_user=2)
+        after = list(Product.objects.order_by("slug").values_list("slug", "name", "price", "stock"))
+        self.assertEqual(after, before)
+
+    def test_every_endpoint_stays_within_its_query_threshold(self):
+        for name, limits in THRESHOLDS.items():
+            result = self.bench.run_endpoint(name, repeat=3, warmup=1, limits={"queries": limits["queries"]})
+            self.assertTrue(result["passed"], (name, result["queries"], limits["queries"]))
+            self.assertEqual(result["runs"], 3)
+
+
+class RequestInstrumentationTests(TestCase):
+    def test_server_timing_and_request_log(self):
+        make_product(stock=5)
+        with self.assertLogs("shop.requests", "INFO") as logs:
+            response = self.client.get("/api/products/widget/")
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="2 queries", serialize;dur=')
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((line["view"], line["status"], line["queries"]), ("product-detail", 200, 2))
+        self.assertGreater(line["serialize_ms"], 0)
+
+    @override_settings(SLOW_QUERY_MS=0, REPEATED_QUERY_THRESHOLD=1)
+    def test_slow_and_repeated_queries_are_logged_by_view(self):
+        make_product(stock=5)
+        self.client.get("/api/products/widget/")  # fill the catalog cache
+        with self.assertLogs("shop.sql", "WARNING") as logs:
+            self.client.get("/api/products/widget/")
+            self.client.get("/api/products/widget/")
+        messages = [record.getMessage() for record in logs.records]
+        self.assertTrue(all("product-detail" in message for message in messages))
+        self.assertTrue(any(message.startswith("Slow query") for message in messages))
+        self.assertTrue(any(message.startswith("Possible N+1") for message in messages))
+
+    async def test_async_views_are_timed(self):
+        await sync_to_async(make_product)(stock=5)
+        with self.assertLogs("shop.requests", "INFO") as logs:
+            response = await self.async_client.get("/api/async/products/widget/")
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response["Server-Timing"], r"view;dur=[\d.]+, render;dur=")
+        self.assertRegex(response["Server-Timing"], r'desc="[1-9]\d* queries"')
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((line["view"], line["status"]), ("async-product-detail", 200))
+        self.assertGreater(line["queries"], 0)
+
+    def test_queries_on_other_threads_count(self):
+        # Under ASGI the async ORM queries through a sync_to_async thread's
+        # own connection; the request's context travels with it.
+        def query():
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            finally:
+                connection.close()
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            thread = threading.Thread(target=contextvars.copy_context().run, args=(query,))
+            thread.start()
+            thread.join()
+        finally:
+            _current.reset(token)
+        self.assertEqual(metrics.queries, 1)
+
+
+class MetricsTests(TestCase):
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    @override_settings(METRICS_TOKEN="scrape-me")
+    def test_metrics_require_staff_or_token(self):
+        self.assertEqual(self.client.get("/api/metrics").status_code, 403)
+        self.assertEqual(
+            self.client.get("/api/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403
+        )
+        response = self.client.get("/api/metrics", HTTP_AUTHORIZATION="Bearer scrape-me")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"# TYPE shop_http_request_duration_seconds histogram", response.content)
+
+    def test_requests_and_checkouts_are_counted_by_route(self):
+        labels = {"route": "product", "method": "GET", "status": "200"}
+        requests = self.sample("shop_http_requests_total", **labels)
+        catalog_hits = self.sample("shop_cache_requests_total", cache="catalog", result="hit")
+        make_product(stock=5)
+        self.client.get("/api/products/")
+        self.client.get("/api/products/")
+        self.assertEqual(self.sample("shop_http_requests_total", **labels), requests + 2)
+        self.assertEqual(
+            self.sample("shop_cache_requests_total", cache="catalog", result="hit"), catalog_hits + 1
+        )
+
+        empty = self.sample("shop_checkouts_total", outcome="empty_cart")
+        user = User.objects.create_user(username="erin", password="pw")
+        cart = Cart.objects.create(user=user)
+        client = APIClient()
+        client.force_authenticate(user)
+        self.assertEqual(client.post(f"/api/cart/{cart.pk}/checkout/").status_code, 400)
+        self.assertEqual(self.sample("shop_checkouts_total", outcome="empty_cart"), empty + 1)
+
+        staff = User.objects.create_user(username="ops", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        self.assertIn(b'route="cart"', self.client.get("/api/metrics").content)
+
+    @override_settings(DATABASE_POOL=True)
+    def test_pool_stats_are_exported_as_gauges_and_counter_increments(self):
+        queued = self.sample("shop_db_pool_events_total", database="pooltest", event="queued")
+        waited = self.sample("shop_db_pool_wait_seconds_total", database="pooltest")
+        snapshots = [
+            {"pool_max": 10, "pool_size": 4, "pool_available": 1, "requests_waiting": 2,
+             "requests_queued": 5, "requests_wait_ms": 1500},
+            {"pool_max": 10, "pool_size": 3, "pool_available": 3,
+             "requests_queued": 7, "requests_wait_ms": 2000},
+        ]
+        with mock.patch("shop.metrics.pool_stats", side_effect=[{"pooltest": s} for s in snapshots]):
+            record_pool_stats(force=True)
+            self.assertEqual(self.sample("shop_db_pool_connections", database="pooltest", state="in_use"), 3)
+            self.assertEqual(self.sample("shop_db_pool_requests_waiting", database="pooltest"), 2)
+            record_pool_stats(force=True)
+        self.assertEqual(self.sample("shop_db_pool_connections", database="pooltest", state="idle"), 3)
+        self.assertEqual(self.sample("shop_db_pool_requests_waiting", database="pooltest"), 0)
+        self.assertEqual(self.sample("shop_db_pool_events_total", database="pooltest", event="queued"), queued + 7)
+        self.assertEqual(self.sample("shop_db_pool_wait_seconds_total", database="pooltest"), waited + 2.0)
+
+
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_go_to_the_replica_until_a_write(self):
+        self.assertIsNone(self.router.db_for_read(Product))
+        with use_replica("replica_1"):
+            self.assertEqual(self.router.db_for_read(Product), "replica_1")
+            self.assertEqual(self.router.db_for_write(Cart), "default")
+            self.assertIsNone(self.router.db_for_read(Product))
+        self.assertIsNone(self.router.db_for_read(Product))
+
+    def test_reads_inside_a_transaction_stay_on_the_primary(self):
+        with use_replica("replica_1"), transaction.atomic():
+            self.assertIsNone(self.router.db_for_read(Product))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        with use_replica() as state:
+            self.assertIsNone(state)
+            self.assertIsNone(self.router.db_for_read(Product))
+
+
+@override_settings(DATABASE_ROUTERS=["shop.routing.ReplicaRouter"], DATABASE_REPLICAS=["replica_1"])
+class ReplicaReadTests(TestCase):
+    """
+    A second SQLite file as the replica, added for this class only. Rows
+    created only there show which database served a request.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.settings["replica_1"] = connections.configure_settings({
+            "default": connections.settings["default"],
+            "replica_1": {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": os.path.join(cls.replica_dir, "replica.sqlite3"),
+            },
+        })["replica_1"]
+        call_command("migrate", database="replica_1", verbosity=0)
+        # Declared here: the alias doesn't exist when the runner collects tests.
+        cls.databases = {"default", "replica_1"}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica_1"].close()
+        del connections["replica_1"]
+        del connections.settings["replica_1"]
+        shutil.rmtree(cls.replica_dir)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="replica", password="pass")
+        # bulk_create: save() signals would write their side effects to the primary.
+        replica = "replica_1"
+        User.objects.using(replica).bulk_create([User(pk=cls.user.pk, username="replica")])
+        category, = Category.objects.using(replica).bulk_create([Category(name="Lamps", slug="lamps")])
+        cls.product, = Product.objects.using(replica).bulk_create([Product(
+            category=category, name="Desk Lamp", slug="desk-lamp", price=Decimal("20.00"), stock=5
+        )])
+        Order.objects.using(replica).bulk_create([Order(pk=1, user_id=cls.user.pk, total=Decimal("20.00"))])
+
+    def setUp(self):
+        catalog_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_catalog_reads_use_the_replica(self):
+        self.assertEqual(self.client.get("/api/products/desk-lamp/").status_code, 200)
+        self.assertEqual(self.client.get("/api/products/").data["count"], 1)
+        self.assertEqual(self.client.get("/api/categories/lamps/products/").status_code, 200)
+        self.assertFalse(Product.objects.exists())
+
+    def test_order_history_uses_the_replica(self):
+        response = self.client.get("/api/orders/my-orders/")
+        self.assertEqual([order["id"] for order in response.data["results"]], [1])
+
+    def test_cart_and_writes_use_the_primary(self):
+        response = self.client.post("/api/cart-items/", {"product": self.product.pk, "quantity": 1}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("product", response.data)
+        self.client.get("/api/cart/my-cart/")
+        self.assertTrue(Cart.objects.filter(user=self.user).exists())
+        self.assertFalse(Cart.objects.using("replica_1").exists())
+
+
+@skipUnless(connection.vendor == "postgresql", "query plans are checked on PostgreSQL")
+class QueryPlanTests(TransactionTestCase):
+    """
+    The main endpoint queries must be answered from indexes on a large
+    catalog: EXPLAIN may not show a sequential scan of any big table.
+    VACUUM (which needs to run outside a transaction) sets the visibility
+    map, as autovacuum would, so that index-only scans are possible.
+    """
+
+    large_tables = {
+        "shop_product", "shop_order", "shop_orderitem", "shop_cart", "shop_cartitem", "shop_stockhold",
+    }
+    paths = [
+        "/api/products/?category=category-7",
+        "/api/products/?category=category-7&in_stock=true&ordering=price",
+        "/api/products/?min_price=10&max_price=10.50",
+        "/api/products/?pagination=cursor",
+        "/api/products/?pagination=cursor&in_stock=true",
+        "/api/products/?search=12345",
+        "/api/products/product-123/",
+        "/api/products/facets/?category=category-7",
+        "/api/cart/my-cart/",
+        "/api/cart-items/",
+        "/api/orders/my-orders/",
+    ]
+
+    def setUp(self):
+        self.data = seed_catalog(
+            categories=50, products=20000, users=2000, orders_per_user=5, cart_items=1
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("VACUUM ANALYZE")
+
+    def sequential_scans(self, plan):
+        if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in self.large_tables:
+            yield plan["Relation Name"]
+        for child in plan.get("Plans", []):
+            yield from self.sequential_scans(child)
+
+    def test_endpoint_queries_use_indexes(self):
+        catalog_cache().clear()
+        client = APIClient()
+        client.force_authenticate(self.data.users[0])
+        failures = []
+        for path in self.paths:
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(client.get(path, HTTP_ACCEPT="application/json").status_code, 200, path)
+            for query in ctx.captured_queries:
+                if not query["sql"].startswith("SELECT"):
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute("EXPLAIN (FORMAT JSON) " + query["sql"])
+                    plan = cursor.fetchone()[0][0]["Plan"]
+                for table in self.sequential_scans(plan):
+                    failures.append(f"{path}: Seq Scan on {table}: {query['sql'][:300]}")
+        self.assertEqual(failures, [])
+
+
+class ConcurrentReservationTests(TransactionTestCase):
+    """Many buyers racing for the last units must never oversell."""
+
+    stock = 5
+    buyers = 20
+
+    def test_concurrent_reservations_never_exceed_stock(self):
+        product = make_product(stock=self.stock)
+        items = [make_item(f"buyer{i}", product) for i in range(self.buyers)]
+        start = threading.Barrier(self.buyers)
+        outcomes = []
+
+        def buy(item):
+            try:
+                start.wait()
+                for _ in range(200):
+                    try:
+                        reserve(item, 1)
+                        outcomes.append(True)
+                        return
+                    except InsufficientStock:
+                        outcomes.append(False)
+                        return
+                    except OperationalError:
+                        # SQLite serializes writers with "database is locked".
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(item,)) for item in items]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        held = StockHold.objects.aggregate(total=Sum("quantity"))["total"]
+        self.assertEqual(len(outcomes), self.buyers)
+        self.assertEqual(outcomes.count(True), self.stock)
+        self.assertEqual(product.reserved, self.stock)
+        self.assertEqual(held, self.stock)
@@ -0,0 +1,198 @@
+"""
+Refresh-token blacklist checks that don't hit the database for the common
+case, and pruning of expired outstanding tokens.
+
+simplejwt checks every refresh token with a BlacklistedToken/OutstandingToken
+join. Almost all tokens presented are not blacklisted, so each process keeps
+a Bloom filter of blacklisted JTIs: a miss is definitive, a hit is confirmed
+against the database (false positives cost one query, never a wrong answer).
+
+The filter is kept current by pulling BlacklistedToken rows with recent ids
+at most every TOKEN_BLACKLIST_SYNC_INTERVAL seconds; tokens blacklisted by
+this process are added immediately. Ids are re-read with some overlap
+because sequence order isn't commit order. The filter is rebuilt from
+unexpired rows once per refresh-token lifetime, or when it fills up.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .metrics import record_cache
+
+
+# Rows with ids this far below the highest id seen are re-read on every sync.
+SYNC_ID_OVERLAP = 1000
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(capacity, 1)
+        self.size = max(64, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: k positions from two 64-bit halves of one digest.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        """Add `key`; returns False if it (probably) was already present."""
+        new = False
+        for position in self._positions(key):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __contains__(self, key):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key)
+        )
+
+
+class BlacklistFilter:
+    def __init__(self, capacity, sync_interval):
+        self.capacity = capacity
+        self.sync_interval = sync_interval
+        self.negatives = 0
+        self.confirmed = 0
+        self.false_positives = 0
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._filter = None
+        self._last_id = 0
+        self._built_at = 0.0
+        self._synced_at = 0.0
+
+    def _rebuild(self):
+        rows = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+        capacity = max(self.capacity, 2 * rows.count())
+        bloom = BloomFilter(capacity)
+        last_id = 0
+        for row_id, jti in rows.values_list("id", "token__jti").iterator(chunk_size=5000):
+            bloom.add(jti)
+            last_id = max(last_id, row_id)
+        self._filter, self._last_id = bloom, last_id
+        self._built_at = self._synced_at = time.monotonic()
+
+    def _pull(self):
+        rows = (
+            BlacklistedToken.objects.filter(id__gt=self._last_id - SYNC_ID_OVERLAP)
+            .order_by("id")
+            .values_list("id", "token__jti")
+        )
+        for row_id, jti in rows:
+            self._filter.add(jti)
+            self._last_id = max(self._last_id, row_id)
+        self._synced_at = time.monotonic()
+
+    def sync(self):
+        now = time.monotonic()
+        with self._lock:
+            lifetime = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+            if (
+                self._filter is None
+                or self._filter.count > self._filter.capacity
+                or now - self._built_at > lifetime
+            ):
+                self._rebuild()
+            elif now - self._synced_at >= self.sync_interval:
+                self._pull()
+
+    def add(self, jti):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+
+    def is_blacklisted(self, jti):
+        self.sync()
+        # A "hit" is an answer from the filter alone, without the database.
+        if jti not in self._filter:
+            self.negatives += 1
+            record_cache("token_blacklist", True)
+            return False
+        record_cache("token_blacklist", False)
+        if BlacklistedToken.objects.filter(token__jti=jti).exists():
+            self.confirmed += 1
+            return True
+        self.false_positives += 1
+        return False
+
+    def stats(self):
+        return {
+            "entries": self._filter.count if self._filter is not None else 0,
+            "negatives": self.negatives,
+            "confirmed": self.confirmed,
+            "false_positives": self.false_positives,
+        }
+
+
+blacklist_filter = BlacklistFilter(
+    capacity=settings.TOKEN_BLACKLIST_FILTER_CAPACITY,
+    sync_interval=settings.TOKEN_BLACKLIST_SYNC_INTERVAL,
+)
+
+
+class FilteredRefreshToken(RefreshToken):
+    def check_blacklist(self):
+        if blacklist_filter.is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        # Added right away: if the transaction rolls back, the JTI is merely
+        # a false positive that the database check clears.
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return super().blacklist()
+
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
+
+
+def prune_outstanding_tokens(chunk_size=None, now=None, pause=0):
+    """
+    Delete expired outstanding tokens (and their blacklist entries),
+    `chunk_size` rows per transaction so locks and WAL stay small.
+
+    Refresh tokens share one lifetime, so expired rows are the low end of
+    the id range and each chunk is a short walk of the primary key index.
+    Returns the number of outstanding tokens deleted.
+    """
+    chunk_size = chunk_size or settings.TOKEN_PRUNE_CHUNK_SIZE
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=now)
+                .order_by("id")
+                .values_list("id", flat=True)[:chunk_size]
+            )
+            if ids:
+                BlacklistedToken.objects.filter(token_id__in=ids).delete()
+                OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+        if len(ids) < chunk_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
@@ -12,6 +12,8 @@ from .views import (
     CartViewSet,
     CartItemViewSet,   # <-- separate viewset for items
 )
+from . import async_views
+from .metrics import metrics_view
 
 router = DefaultRouter()
 router.register(r"categories", CategoryViewSet)
@@ -28,4 +30,12 @@ urlpatterns = [
     path("auth/login/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("auth/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("auth/logout/", LogoutView.as_view(), name="auth_logout"),
+    path("metrics", metrics_view, name="metrics"),
+
+    # Async (ASGI) catalog reads; same payloads as the viewsets above.
+    path("async/products/", async_views.product_list, name="async-product-list"),
+    path("async/products/<slug:slug>/", async_views.product_detail, name="async-product-detail"),
+    path("async/categories/", async_views.category_list, name="async-category-list"),
+    path("async/categories/<slug:slug>/", async_views.category_detail, name="async-category-detail"),
+    path("async/categories/<slug:slug>/products/", async_views.category_products, name="async-category-products"),
 ]
@@ -1,22 +1,22 @@
 from rest_framework import viewsets, generics, permissions, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
-from rest_framework_simplejwt.tokens import RefreshToken
 from django_filters.rest_framework import DjangoFilterBackend, FilterSet, NumberFilter, BooleanFilter, CharFilter
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import RetrieveAPIView
 from django.contrib.auth.models import User
-# DRF filters (for SearchFilter, OrderingFilter)
-from rest_framework import filters as drf_filters
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.http import StreamingHttpResponse
 
 from .models import Category, Product, Profile, Cart, CartItem, Order, OrderItem
 from .serializers import (
     CategorySerializer,
     ProductSerializer,
+    ProductBatchSerializer,
     RegisterSerializer,
     LogoutSerializer,
     ProfileSerializer,
@@ -27,16 +27,20 @@ from .serializers import (
     CartSerializer,
 )
 from .permissions import IsAdminOrReadOnly
+from .pagination import StandardResultsSetPagination, ProductPagination
+from .search import ProductSearchFilter, ProductOrderingFilter
+from .cache import CatalogCacheMixin, make_etag, queryset_state
+from .services import checkout_cart, CheckoutError
+from .facets import parse_price_buckets, product_facets
+from .metrics import record_checkout
+from .reservations import InsufficientStock, reserve, release
+from .routing import ReplicaReadMixin
+from .tokens import FilteredRefreshToken
+from .catalog_io import FORMATS as CATALOG_FORMATS, export_lines, export_rows
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = "page_size"
-    max_page_size = 100
-
-
 # Custom Filters
 class ProductFilter(FilterSet):
     min_price = NumberFilter(field_name="price", lookup_expr="gte")
@@ -50,54 +54,160 @@ class ProductFilter(FilterSet):
         
     def filter_in_stock(self, queryset, name, value):
         if value:
-            return queryset.filter(stock__gt=0)
+            # units not held by cart reservations
+            return queryset.filter(stock__gt=F("reserved"))
         return queryset
 
 # -----------------------
 # Category & Product
 # -----------------------
 
-class CategoryViewSet(viewsets.ModelViewSet):
+PRODUCT_LIST_PARAMETERS = [
+    openapi.Parameter('min_price', openapi.IN_QUERY, description="Minimum price", type=openapi.TYPE_NUMBER),
+    openapi.Parameter('max_price', openapi.IN_QUERY, description="Maximum price", type=openapi.TYPE_NUMBER),
+    openapi.Parameter('in_stock', openapi.IN_QUERY, description="In stock", type=openapi.TYPE_BOOLEAN),
+    openapi.Parameter('category', openapi.IN_QUERY, description="Category slug", type=openapi.TYPE_STRING),
+    openapi.Parameter('pagination', openapi.IN_QUERY, description="Set to 'cursor' for keyset pagination (no page count, constant cost per page)", type=openapi.TYPE_STRING, enum=["cursor"]),
+    openapi.Parameter('cursor', openapi.IN_QUERY, description="Opaque cursor from a previous 'next'/'previous' link", type=openapi.TYPE_STRING),
+]
+
+
+class CategoryViewSet(ReplicaReadMixin, CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAdminOrReadOnly]
     lookup_field = "slug"
+    cached_actions = ("list", "retrieve", "products")
+    replica_actions = ("list", "retrieve", "products")
     
     
+    @swagger_auto_schema(manual_parameters=PRODUCT_LIST_PARAMETERS, responses={200: ProductSerializer(many=True)})
     @action(detail=True, methods=["get"], url_path="products", permission_classes=[IsAdminOrReadOnly])
     def products(self, request, slug=None):
         """
-        Returns all products belonging to this category.
+        Returns the products belonging to this category, with the same
+        filtering, search, ordering and pagination as /api/products/.
         """
+        return self.dispatch_cached(self._category_products, request, slug=slug)
+
+    def get_validators(self, request, *args, **kwargs):
+        if self.action == "products":
+            product_view, queryset = self._category_product_queryset(request)
+            last_modified, count = queryset_state(queryset)
+            return make_etag(request, "products", last_modified, count), None
+        # Built from the rows rather than the catalog version, which is per
+        # process without a shared cache. Counter UPDATEs set `updated` too.
+        queryset = self.get_queryset()
+        if self.action == "retrieve":
+            queryset = queryset.filter(slug=kwargs["slug"])
+        last_modified, count = queryset_state(queryset)
+        etag = make_etag(request, "categories", last_modified, count)
+        if self.action == "retrieve":
+            return (etag, last_modified) if count else None
+        return etag, None
+
+    def _category_product_queryset(self, request):
         category = self.get_object()
-        products = Product.objects.filter(category=category)
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        product_view = ProductViewSet(
+            request=request, args=(), kwargs={}, action="list", format_kwarg=self.format_kwarg
+        )
+        queryset = product_view.filter_queryset(
+            product_view.get_queryset().filter(category=category)
+        )
+        return product_view, queryset
+
+    def _category_products(self, request, slug=None):
+        product_view, queryset = self._category_product_queryset(request)
+        page = product_view.paginate_queryset(queryset)
+        serializer = product_view.get_serializer(page, many=True)
+        return product_view.get_paginated_response(serializer.data)
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ReplicaReadMixin, CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Product.objects.select_related("category").all()
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = ProductPagination
 
-    filter_backends = [DjangoFilterBackend, drf_filters.SearchFilter, drf_filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, ProductOrderingFilter]
     filterset_class = ProductFilter 
     search_fields = ["name", "description"]
     ordering_fields = ["price", "created", "updated"]
     ordering = ["-created"]  # default ordering
     lookup_field = "slug"
+    cached_actions = ("list", "retrieve", "facets")
+    replica_actions = ("list", "retrieve", "facets", "export")
     
     
-    @swagger_auto_schema(manual_parameters=[
-        openapi.Parameter('min_price', openapi.IN_QUERY, description="Minimum price", type=openapi.TYPE_NUMBER),
-        openapi.Parameter('max_price', openapi.IN_QUERY, description="Maximum price", type=openapi.TYPE_NUMBER),
-        openapi.Parameter('in_stock', openapi.IN_QUERY, description="In stock", type=openapi.TYPE_BOOLEAN),
-        openapi.Parameter('category', openapi.IN_QUERY, description="Category slug", type=openapi.TYPE_STRING),
-    ])
+    @swagger_auto_schema(manual_parameters=PRODUCT_LIST_PARAMETERS)
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @swagger_auto_schema(manual_parameters=PRODUCT_LIST_PARAMETERS + [
+        openapi.Parameter('search', openapi.IN_QUERY, description="Full-text search", type=openapi.TYPE_STRING),
+        openapi.Parameter('price_buckets', openapi.IN_QUERY, description="Comma-separated price bucket boundaries, e.g. 25,50,100", type=openapi.TYPE_STRING),
+    ])
+    @action(detail=False, methods=["get"], url_path="facets")
+    def facets(self, request):
+        """
+        Per-category counts, the in-stock count and a price histogram for
+        the products matching the current filters and search, computed in
+        one aggregation query and cached per query string.
+        """
+        return self.dispatch_cached(self.compute_facets, request)
+
+    def compute_facets(self, request):
+        edges = parse_price_buckets(request.query_params.get("price_buckets"))
+        return Response(product_facets(self.filter_queryset(self.get_queryset()), edges))
+
+    def get_validators(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.action == "retrieve":
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+        last_modified, count = queryset_state(queryset)
+        etag = make_etag(request, self.action, last_modified, count)
+        if self.action == "retrieve":
+            # No row means a 404, which must not be answered with a 304.
+            return (etag, last_modified) if count else None
+        # A deletion can leave max(updated) unchanged, so lists only get
+        # an ETag (which includes the count), not Last-Modified.
+        return etag, None
+
+    @swagger_auto_schema(request_body=ProductBatchSerializer(child=ProductSerializer()))
+    @action(detail=False, methods=["post"], url_path="batch", permission_classes=[IsAdminUser])
+    def batch(self, request):
+        """
+        Create or update many products at once. Rows carrying an existing
+        `id` or `slug` are partial updates; other rows are creates. The batch
+        is validated as a whole and applied in one transaction; the response
+        lists the outcome of each row in input order.
+        """
+        serializer = ProductBatchSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response({"results": serializer.results}, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(manual_parameters=PRODUCT_LIST_PARAMETERS + [
+        openapi.Parameter('file_format', openapi.IN_QUERY, description="csv (default) or jsonl", type=openapi.TYPE_STRING, enum=["csv", "jsonl"]),
+    ])
+    @action(detail=False, methods=["get"], url_path="export", permission_classes=[IsAdminUser])
+    def export(self, request):
+        """
+        Streams the (filtered) catalog as CSV or JSON Lines without building
+        the payload in memory.
+        """
+        file_format = request.query_params.get("file_format", "csv")
+        if file_format not in CATALOG_FORMATS:
+            raise ValidationError({"file_format": f"Must be one of {', '.join(CATALOG_FORMATS)}."})
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            export_lines(export_rows(queryset), file_format),
+            content_type="text/csv" if file_format == "csv" else "application/x-ndjson",
+        )
+        response["Content-Disposition"] = f'attachment; filename="products.{file_format}"'
+        return response
+
 
 
 # -----------------------
@@ -120,7 +230,7 @@ class LogoutView(generics.GenericAPIView):
 
         refresh_token = serializer.validated_data["refresh"]
         try:
-            token = RefreshToken(refresh_token)
+            token = FilteredRefreshToken(refresh_token)
             token.blacklist()
             return Response({"detail": "Successfully logged out."}, status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
@@ -132,8 +242,6 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        print("DEBUG USER:", self.request.user)
-        print("DEBUG AUTH:", self.request.auth)
         if self.request.user.is_staff and "user_id" in self.request.query_params:
             return User.objects.get(pk=self.request.query_params["user_id"])
         return self.request.user
@@ -162,39 +270,31 @@ class CartViewSet(viewsets.ReadOnlyModelViewSet):
 
     def get_queryset(self):
         # Allow fetching old carts (order history)
-        return Cart.objects.filter(user=self.request.user)
+        return Cart.objects.filter(user=self.request.user).with_items()
 
     @action(detail=False, methods=["get"], url_path="my-cart")
     def my_cart(self, request):
-        cart, _ = Cart.objects.get_or_create(user=request.user, status='active')
+        cart = self.get_queryset().filter(status="active").first()
+        if cart is None:
+            cart, _ = Cart.objects.get_or_create(user=request.user, status="active")
         serializer = self.get_serializer(cart)
         return Response(serializer.data)
 
     @action(detail=True, methods=["post"], url_path="checkout")
     def checkout(self, request, pk=None):
         cart = self.get_object()
-        
-        # Ensure only open/active carts can be checked out
-        if cart.status != "active":
-            return Response({"error": "Only active carts can be checked out"},
-                            status=status.HTTP_400_BAD_REQUEST)
-
-        if not cart.items.exists():
-            return Response({"error": "Cart is empty"},
-                            status=status.HTTP_400_BAD_REQUEST)
-
-        # Convert cart -> order
-        order = Order.objects.create(user=request.user)
-        for item in cart.items.all():
-            OrderItem.objects.create(
-                order=order, product=item.product, quantity=item.quantity
-            )
-
-        # Close cart
-        cart.items.all().delete()
-        cart.status = "checked_out"
-        cart.save()
 
+        try:
+            order = checkout_cart(cart)
+        except CheckoutError as e:
+            record_checkout(e.code)
+            body = {"error": e.message}
+            if e.products:
+                body["products"] = e.products
+            return Response(body, status=status.HTTP_400_BAD_REQUEST)
+        record_checkout("completed")
+
+        order = Order.objects.prefetch_related("items__product").get(pk=order.pk)
         return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
 
 
@@ -205,48 +305,73 @@ class CartItemViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         cart, _ = Cart.objects.get_or_create(user=self.request.user, status="active")
-        return cart.items.all()
+        return cart.items.select_related("product")
 
     def perform_create(self, serializer):
         cart, _ = Cart.objects.get_or_create(user=self.request.user, status="active")
         product = serializer.validated_data["product"]
         quantity = serializer.validated_data.get("quantity", 1)
 
-        existing_item = CartItem.objects.filter(cart=cart, product=product).first()
-        if existing_item:
-            existing_item.quantity += quantity
-            existing_item.save()
-            serializer.instance = existing_item
-        else:
-            serializer.save(cart=cart)
-
+        with transaction.atomic():
+            existing_item = (
+                CartItem.objects.select_for_update().filter(cart=cart, product=product).first()
+            )
+            if existing_item:
+                existing_item.quantity += quantity
+                existing_item.save()
+                serializer.instance = existing_item
+            else:
+                serializer.save(cart=cart)
+            self.reserve_stock(serializer.instance)
 
     def perform_update(self, serializer):
         if not serializer.instance.cart.status == "active":
             raise ValidationError("Cannot modify items in a checked-out cart.")
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
+            self.reserve_stock(serializer.instance)
 
     def perform_destroy(self, instance):
         if not instance.cart.status == "active":
             raise ValidationError("Cannot remove items from a checked-out cart.")
-        instance.delete()
-        
+        with transaction.atomic():
+            release(instance)
+            instance.delete()
+
+    def reserve_stock(self, item):
+        # Raising inside the atomic block also rolls back the item change.
+        try:
+            reserve(item, item.quantity)
+        except InsufficientStock as e:
+            raise ValidationError(
+                {"quantity": [f"Only {e.available} unit(s) of {e.product.name} available."]}
+            )
 
 
 # -----------------------
 # Orders
 # -----------------------
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderSerializer
     # Allow only GET, PATCH globally — POST is reserved for cancel (custom action)
     http_method_names = ["get", "patch", "post"]
+    # Order history; may trail a just-completed checkout by the replica lag.
+    replica_actions = ("list", "retrieve", "my_orders")
+
+    pagination_class = StandardResultsSetPagination
 
     def get_queryset(self):
         if not self.request.user.is_authenticated:
             return Order.objects.none()
-        return Order.objects.filter(user=self.request.user)
+        return (
+            Order.objects.filter(user=self.request.user)
+            .prefetch_related(
+                Prefetch("items", queryset=OrderItem.objects.select_related("product"))
+            )
+            .order_by("-created_at", "-id")
+        )
 
     def create(self, request, *args, **kwargs):
         # Block normal POST order creation
@@ -285,9 +410,13 @@ class OrderViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=["get"], url_path="my-orders")
     def my_orders(self, request):
-        orders = Order.objects.filter(user=request.user)
-        serializer = self.get_serializer(orders, many=True)
-        return Response(serializer.data)
+        """
+        Paginated order history, newest first. Totals and item counts are
+        the values stored at checkout.
+        """
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=["post"], url_path="cancel")
     def cancel(self, request, pk=None):